@@ -0,0 +1,139 @@
+"""End-to-end benchmark of the automation against the local mock server.
+
+Runs the same worker path as main.py (login, prompts, responses, artifact download) in a
+headless browser for every combination of input and capture mode, and reports the
+per-video latency, the per-phase timings and the chapters per hour:
+
+    python benchmarks/bench_e2e.py --videos 3 --chapters 4 --input-mode insert,chunked --capture-mode batch,cdp
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.mock_claude import start_mock_server, DEFAULT_OPTIONS
+from modules.logs import setup_logging
+
+
+def write_fixture(workdir:str, config:dict):
+    """Create the configs/ and accounts/ folders the automation expects, with a fresh cached session"""
+    os.makedirs(os.path.join(workdir, "configs", "bench"))
+    with open(os.path.join(workdir, "configs", "bench", "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+    os.makedirs(os.path.join(workdir, "accounts", "bench"))
+    with open(os.path.join(workdir, "accounts", "bench", "session.json"), "w") as f:
+        json.dump({"validated_at": time.time()}, f)
+
+
+def run_case(base_url:str, workdir:str, args, input_mode:str, capture_mode:str)->dict:
+    """Run one benchmark case and return its summary"""
+    from modules.worker_pool import AccountWorker, run_pool
+    from modules.tracing import start_tracing, stop_tracing, summarize
+
+    config = {
+        "project_link": base_url + "/project/bench",
+        "initial_prompt": "Write a sleep story for video VIDEO_NUMBER. " + "Set the scene carefully. " * args.prompt_repeat,
+        "generation_prompts": [f"Write Chapter {i + 1}." for i in range(args.chapters)],
+        "text_to_be_replaced_by_video_number": "VIDEO_NUMBER",
+        "input_mode": input_mode,
+        "capture_mode": capture_mode,
+        "pipeline": args.pipeline,
+        "incremental": args.incremental,
+    }
+    case_dir = os.path.join(workdir, f"{input_mode}-{capture_mode}")
+    write_fixture(case_dir, config)
+    os.chdir(case_dir)
+
+    trace_path = start_tracing(os.path.join(case_dir, "trace.jsonl"))
+    worker = AccountWorker("bench", "bench", config, headless=True)
+    worker.start()
+    started = time.time()
+    try:
+        results = run_pool([worker], list(range(1, args.videos + 1)))
+    finally:
+        elapsed = time.time() - started
+        worker.close()
+        stop_tracing()
+
+    summary = summarize(trace_path)
+    video = summary["phases"].get("video", {"p50": 0.0, "p95": 0.0})
+    return {
+        "input_mode": input_mode,
+        "capture_mode": capture_mode,
+        "videos": args.videos,
+        "failed": sorted(str(number) for number, result in results.items() if result["error"]),
+        "elapsed": elapsed,
+        "video_p50": video["p50"],
+        "video_p95": video["p95"],
+        "chapters_per_hour": summary["chapters"] / (elapsed / 3600) if elapsed else 0.0,
+        "phases": summary["phases"],
+    }
+
+
+def print_results(cases:list):
+    print("\n" + "=" * 88)
+    print(" End-to-end Benchmark ".center(88, "="))
+    print("=" * 88)
+    print(f"{'Input':<10}{'Capture':<10}{'Videos':>8}{'Failed':>8}{'Video p50':>12}{'Video p95':>12}{'Chapters/h':>13}{'Total (s)':>12}")
+    print("-" * 88)
+    for case in cases:
+        print(f"{case['input_mode']:<10}{case['capture_mode']:<10}{case['videos']:>8}{len(case['failed']):>8}"
+              f"{case['video_p50']:>12.1f}{case['video_p95']:>12.1f}{case['chapters_per_hour']:>13.1f}{case['elapsed']:>12.1f}")
+    for case in cases:
+        print(f"\n{case['input_mode']} / {case['capture_mode']} phases (p50 / p95 seconds):")
+        for phase, stats in case["phases"].items():
+            print(f"  {phase:<22}{stats['p50']:>8.2f} / {stats['p95']:<8.2f} ({stats['count']} spans)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the automation end to end against the mock Claude server")
+    parser.add_argument("--videos", type=int, default=2)
+    parser.add_argument("--chapters", type=int, default=3)
+    parser.add_argument("--prompt-repeat", type=int, default=100, help="Makes the initial prompt longer")
+    parser.add_argument("--input-mode", default="insert", help="Comma separated input modes to compare")
+    parser.add_argument("--capture-mode", default="batch", help="Comma separated capture modes to compare")
+    parser.add_argument("--pipeline", action="store_true", help="Extract each video in a second tab during the next one")
+    parser.add_argument("--incremental", action="store_true", help="Save each chapter as soon as its response finishes")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary output folders")
+    for name in ("chars_per_second", "first_token_delay", "chapter_words", "stall_rate", "error_rate", "limit_after"):
+        parser.add_argument("--" + name.replace("_", "-"), type=type(DEFAULT_OPTIONS[name]), default=DEFAULT_OPTIONS[name])
+    args = parser.parse_args()
+    setup_logging()
+
+    server = start_mock_server(chars_per_second=args.chars_per_second, first_token_delay=args.first_token_delay,
+                               chapter_words=args.chapter_words, stall_rate=args.stall_rate,
+                               error_rate=args.error_rate, limit_after=args.limit_after, seed=0)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    workdir = tempfile.mkdtemp(prefix="claude-bench-")
+    original_dir = os.getcwd()
+    cases = []
+    try:
+        for input_mode, capture_mode in itertools.product(args.input_mode.split(","), args.capture_mode.split(",")):
+            print(f"\nRunning {input_mode} / {capture_mode}...")
+            cases.append(run_case(base_url, workdir, args, input_mode.strip(), capture_mode.strip()))
+    finally:
+        os.chdir(original_dir)
+        server.shutdown()
+        if args.keep:
+            print(f"Output kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(cases)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(cases, f, indent=4)
+    if any(case["failed"] for case in cases):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
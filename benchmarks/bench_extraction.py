@@ -0,0 +1,170 @@
+"""Offline extraction benchmark and regression check on recorded page snapshots.
+
+Replays every snapshot recorded with the "record_snapshots" config option from a local
+file server, runs check_limit_reached, get_reactivation_time and download_artifacts on it in
+a headless browser, and checks the results against what the live run got:
+
+    python benchmarks/bench_extraction.py --snapshots snapshots --modes batch,dom --output results.json
+
+Run it before deploying a selector change (modules/locators.py). With --baseline set to the
+--output of an earlier run, chapters whose contents changed are reported too. Exits with 1
+if any snapshot fails.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.replay_server import start_replay_server, DEFAULT_PANEL_DELAY_MS
+from modules.snapshots import SNAPSHOT_DIR, load_snapshot, list_snapshots
+from modules.tracing import percentile
+from modules.logs import setup_logging
+
+MODES = ("batch", "dom")
+
+
+def timed(timings:dict, name:str, function):
+    started = time.perf_counter()
+    try:
+        return function()
+    finally:
+        timings[name] = time.perf_counter() - started
+
+
+def replay_case(driver, base_url:str, snapshot:dict, mode:str, store, baseline:dict)->dict:
+    """Replay one snapshot with one extraction mode and compare the results with the recorded ones"""
+    from modules.automation_parts import check_limit_reached, get_reactivation_time, download_artifacts, find_bad_chapters
+
+    expected = snapshot["expected"]
+    timings = {}
+    problems = []
+    hashes = {}
+    characters = 0
+    try:
+        timed(timings, "page_load", lambda: driver.get(f"{base_url}/snapshot/{snapshot['id']}"))
+        limit = timed(timings, "check_limit", lambda: check_limit_reached(driver))
+        if limit != expected["limit"]:
+            problems.append(f"limit detected: {limit}, recorded: {expected['limit']}")
+        if expected["limit"]:
+            reactivation_time = timed(timings, "reactivation_time", lambda: get_reactivation_time(driver))
+            if reactivation_time != expected["reactivation_time"]:
+                problems.append(f"reactivation time {reactivation_time!r}, recorded {expected['reactivation_time']!r}")
+
+        if snapshot["kind"] == "conversation":
+            video = timed(timings, "extraction", lambda: download_artifacts(driver, snapshot["id"], mode, batch=mode == "batch", store=store))
+            chapters = video.read_chapters() if video is not None else {}
+            characters = sum(len(content) for content in chapters.values())
+            if len(chapters) != expected["artifact_count"]:
+                problems.append(f"{len(chapters)} chapters, recorded {expected['artifact_count']}")
+            if video is not None:
+                bad_chapters = find_bad_chapters(video, expected["artifact_count"])
+                if bad_chapters:
+                    problems.append(f"chapters {bad_chapters} empty or truncated")
+                hashes = video.hashes()
+            previous = baseline.get((snapshot["id"], mode))
+            if previous is not None:
+                changed = sorted(name for name in set(previous) | set(hashes) if previous.get(name) != hashes.get(name))
+                if changed:
+                    problems.append(f"changed since the baseline: {', '.join(changed)}")
+    except Exception as e:
+        problems.append(f"error: {e}")
+
+    return {"snapshot": snapshot["id"], "kind": snapshot["kind"], "mode": mode, "timings": timings, "characters": characters,
+            "same_as_recorded": sum(hashes.get(name) == value for name, value in expected.get("hashes", {}).items()),
+            "hashes": hashes, "problems": problems}
+
+
+def load_baseline(path:str)->dict:
+    """Get {(snapshot id, mode): chapter hashes} from the --output of an earlier run"""
+    with open(path) as f:
+        return {(case["snapshot"], case["mode"]): case["hashes"] for case in json.load(f)["cases"] if case["kind"] == "conversation"}
+
+
+def summarize_mode(cases:list)->dict:
+    extraction = [case["timings"]["extraction"] for case in cases if "extraction" in case["timings"]]
+    checks = [case["timings"]["check_limit"] for case in cases if "check_limit" in case["timings"]]
+    characters = sum(case["characters"] for case in cases)
+    return {
+        "snapshots": len(cases),
+        "failed": sum(bool(case["problems"]) for case in cases),
+        "extraction_p50": percentile(extraction, 0.5) if extraction else 0.0,
+        "extraction_p95": percentile(extraction, 0.95) if extraction else 0.0,
+        "check_limit_p50": percentile(checks, 0.5) if checks else 0.0,
+        "characters_per_second": characters / sum(extraction) if extraction and sum(extraction) else 0.0,
+    }
+
+
+def print_results(cases:list, summary:dict):
+    for case in cases:
+        for problem in case["problems"]:
+            print(f"FAIL {case['snapshot']} ({case['mode']}): {problem}")
+    print("\n" + "=" * 84)
+    print(" Extraction Replay Benchmark ".center(84, "="))
+    print("=" * 84)
+    print(f"{'Mode':<10}{'Snapshots':>11}{'Failed':>8}{'Extract p50':>14}{'Extract p95':>14}{'Limit check p50':>17}{'Chars/s':>10}")
+    print("-" * 84)
+    for mode, result in summary.items():
+        print(f"{mode:<10}{result['snapshots']:>11}{result['failed']:>8}{result['extraction_p50']:>14.2f}"
+              f"{result['extraction_p95']:>14.2f}{result['check_limit_p50'] * 1000:>14.1f} ms{result['characters_per_second']:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and check the extraction code on recorded page snapshots")
+    parser.add_argument("--snapshots", default=SNAPSHOT_DIR, help="Folder with the recorded snapshots")
+    parser.add_argument("--modes", default="batch", help=f"Comma separated extraction modes to compare ({', '.join(MODES)})")
+    parser.add_argument("--limit", type=int, default=0, help="Only replay the newest LIMIT snapshots")
+    parser.add_argument("--panel-delay-ms", type=int, default=DEFAULT_PANEL_DELAY_MS, help="Simulated time for a panel to open")
+    parser.add_argument("--baseline", help="--output of an earlier run to compare the chapter contents with")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="Keep the extracted chapters")
+    args = parser.parse_args()
+    modes = [mode.strip() for mode in args.modes.split(",")]
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"Unknown mode '{mode}' (expected one of {', '.join(MODES)})")
+    paths = list_snapshots(args.snapshots)[-args.limit:] if args.limit else list_snapshots(args.snapshots)
+    if not paths:
+        parser.error(f"No snapshots in {args.snapshots}")
+    setup_logging()
+
+    from modules.automation_parts import launch_driver
+    from modules.storage import FileStore
+
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+    server = start_replay_server(args.snapshots, panel_delay_ms=args.panel_delay_ms)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    workdir = tempfile.mkdtemp(prefix="claude-replay-")
+    store = FileStore(workdir)
+    driver = launch_driver("dom", headless=True)
+    cases = []
+    try:
+        for i, path in enumerate(paths, 1):
+            snapshot = load_snapshot(path)
+            for mode in modes:
+                print(f"[{i}/{len(paths)}] {snapshot['id']} ({mode})")
+                cases.append(replay_case(driver, base_url, snapshot, mode, store, baseline))
+    finally:
+        driver.quit()
+        server.shutdown()
+        if args.keep:
+            print(f"Chapters kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = {mode: summarize_mode([case for case in cases if case["mode"] == mode]) for mode in modes}
+    print_results(cases, summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "cases": cases}, f, indent=4)
+    if any(case["problems"] for case in cases):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Startup benchmark of the command line entry points.
+
+Runs each command several times in a fresh interpreter and reports its wall time, then
+runs it once more under python -X importtime and lists the slowest imports:
+
+    python benchmarks/bench_startup.py --runs 5 --top 10
+
+Commands run in a temporary folder with one account and one configuration, so that
+--list and --check have something to read.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    "main --help": [os.path.join(REPO_DIR, "main.py"), "--help"],
+    "main --list": [os.path.join(REPO_DIR, "main.py"), "--list"],
+    "main --check": [os.path.join(REPO_DIR, "main.py"), "--accounts", "bench", "--config", "bench", "--videos", "1-10", "--check"],
+    "import create_config": ["-c", "import create_config"],
+}
+
+
+def write_fixture(workdir:str):
+    os.makedirs(os.path.join(workdir, "accounts", "bench"))
+    os.makedirs(os.path.join(workdir, "configs", "bench"))
+    with open(os.path.join(workdir, "configs", "bench", "config.json"), "w") as f:
+        json.dump({"project_link": "https://claude.ai/project/bench", "initial_prompt": "Video VIDEO_NUMBER",
+                   "generation_prompts": ["Write Chapter 1."], "text_to_be_replaced_by_video_number": "VIDEO_NUMBER"}, f)
+
+
+def run(args:list, workdir:str, importtime:bool=False)->subprocess.CompletedProcess:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + args
+    env = {**os.environ, "PYTHONPATH": REPO_DIR}
+    return subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+
+
+def parse_importtime(stderr:str)->list:
+    """Get (cumulative microseconds, module) for every top level import in -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name[1:].startswith("  "):
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of the command line entry points")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="Number of slowest imports to list per command")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="claude-startup-")
+    results = {}
+    try:
+        write_fixture(workdir)
+        for name, command in COMMANDS.items():
+            times = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                completed = run(command, workdir)
+                times.append(time.perf_counter() - started)
+            imports = parse_importtime(run(command, workdir, importtime=True).stderr)
+            results[name] = {"returncode": completed.returncode, "median": statistics.median(times), "min": min(times),
+                             "imports": [{"module": module, "cumulative_ms": us / 1000} for us, module in imports[:args.top]]}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("\n" + "=" * 64)
+    print(" Startup Benchmark ".center(64, "="))
+    print("=" * 64)
+    print(f"{'Command':<26}{'Exit':>6}{'Median (ms)':>16}{'Min (ms)':>16}")
+    print("-" * 64)
+    for name, result in results.items():
+        print(f"{name:<26}{result['returncode']:>6}{result['median'] * 1000:>16.1f}{result['min'] * 1000:>16.1f}")
+    for name, result in results.items():
+        print(f"\nSlowest imports of {name}:")
+        for entry in result["imports"]:
+            print(f"  {entry['module']:<40}{entry['cumulative_ms']:>10.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""Local stand-in for the Claude web app, implementing the parts of the DOM the automation uses.
+
+Run it on its own with `python benchmarks/mock_claude.py --port 8765` and point a config's
+project_link at http://127.0.0.1:8765/project/mock, or start it from a benchmark with
+start_mock_server().
+"""
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+DEFAULT_OPTIONS = {
+    "chars_per_second": 4000,    # Streaming speed of the response
+    "first_token_delay": 0.5,    # Seconds before the first token is streamed
+    "chapter_words": 800,        # Length of every generated chapter
+    "stall_rate": 0.0,           # Chance that a stream pauses for stall_seconds halfway through
+    "stall_seconds": 90,
+    "error_rate": 0.0,           # Chance that a stream is cut off halfway through (no artifact)
+    "limit_after": 0,            # Show the "limit reached" banner after this many messages (0 = never)
+    "limit_seconds": 60,         # How long the limit lasts
+}
+
+WORDS = ("the quiet river drifted past silver hills while lanterns glowed softly and the old keeper "
+         "told stories of stars that slept beneath the sea and dreams that wandered through ancient "
+         "halls of moonlight").split()
+
+API_PREFIX = "/api/organizations/mock/chat_conversations"
+
+APP_HTML = r"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Mock Claude</title>
+<style>
+body { font-family: sans-serif; margin: 0; display: flex; height: 100vh; }
+#chat { flex: 1; display: flex; flex-direction: column; padding: 16px; overflow: auto; }
+#messages { flex: 1; }
+#panel { width: 45%; border-left: 1px solid #ccc; padding: 16px; overflow: auto; }
+[data-testid="user-message"] { background: #eee; padding: 8px; margin: 8px 0; white-space: pre-wrap; }
+.assistant { padding: 8px; margin: 8px 0; }
+.editor { border: 1px solid #999; min-height: 48px; padding: 8px; white-space: pre-wrap; }
+button { margin: 4px; }
+</style>
+</head>
+<body>
+<div id="chat">
+  <button data-testid="chat-menu-trigger"><div><div id="chat-title">New chat</div></div></button>
+  <div id="limit-banner"></div>
+  <div id="messages"></div>
+  <div class="editor" contenteditable="true" aria-label="Write your prompt to Claude"></div>
+  <div id="controls"><button aria-label="Send message" disabled>Send</button></div>
+</div>
+<div id="panel"></div>
+<script>
+const apiPrefix = "__API_PREFIX__";
+let conversationId = __CONVERSATION_ID__;
+let artifactCount = 0;
+let streaming = false;
+let limitedUntil = null;
+const editor = document.querySelector('[aria-label="Write your prompt to Claude"]');
+const sendButton = document.querySelector('[aria-label="Send message"]');
+const controls = document.getElementById("controls");
+const messages = document.getElementById("messages");
+
+function escapeHtml(text) {
+    return text.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+}
+
+function markdownToHtml(markdown) {
+    return markdown.split(/\n{2,}/).map((block) => {
+        const heading = block.match(/^(#{1,6}) (.*)$/);
+        if (heading) return `<h${heading[1].length}>${escapeHtml(heading[2])}</h${heading[1].length}>`;
+        if (/^- /.test(block)) {
+            return "<ul>" + block.split("\n").map((line) => `<li>${escapeHtml(line.replace(/^- /, ""))}</li>`).join("") + "</ul>";
+        }
+        return `<p>${escapeHtml(block)}</p>`;
+    }).join("");
+}
+
+function updateSendButton() {
+    sendButton.disabled = streaming || limitedUntil !== null || editor.innerText.trim() === "";
+}
+
+function showLimit(resetsAt) {
+    limitedUntil = resetsAt;
+    document.getElementById("limit-banner").innerHTML =
+        resetsAt ? `<div>Message limit reached, resets <span>${resetsAt}</span></div>` : "";
+    updateSendButton();
+}
+
+function openArtifact(artifact) {
+    const panel = document.getElementById("panel");
+    panel.innerHTML = "";
+    const copy = document.createElement("button");
+    copy.innerHTML = "<div><div>Copy</div></div>";
+    copy.addEventListener("click", () => navigator.clipboard.writeText(artifact.content));
+    const content = document.createElement("div");
+    content.id = "markdown-artifact";
+    content.innerHTML = markdownToHtml(artifact.content);
+    panel.append(copy, content);
+}
+
+function addArtifact(container, artifact) {
+    const button = document.createElement("button");
+    button.setAttribute("aria-label", "Preview contents");
+    button.innerHTML = `<div class="artifact-block-cell flex"><div class="leading-tight">${escapeHtml(artifact.title)}</div></div>`;
+    button.addEventListener("click", () => openArtifact(artifact));
+    container.appendChild(button);
+    artifactCount++;
+}
+
+function addUserMessage(text) {
+    const message = document.createElement("div");
+    message.setAttribute("data-testid", "user-message");
+    message.textContent = text;
+    messages.appendChild(message);
+}
+
+function addAssistantMessage(text, artifacts) {
+    const message = document.createElement("div");
+    message.className = "assistant";
+    message.setAttribute("data-is-streaming", "false");
+    const body = document.createElement("div");
+    body.textContent = text;
+    message.appendChild(body);
+    messages.appendChild(message);
+    (artifacts || []).forEach((artifact) => addArtifact(message, artifact));
+    return {message, body};
+}
+
+function showStopButton(show) {
+    const existing = document.querySelector('[aria-label="Stop response"]');
+    if (show && !existing) {
+        const stop = document.createElement("button");
+        stop.setAttribute("aria-label", "Stop response");
+        stop.textContent = "Stop";
+        controls.appendChild(stop);
+    } else if (!show && existing) {
+        existing.remove();
+    }
+}
+
+async function send() {
+    const prompt = editor.innerText.trim();
+    if (!prompt || streaming || limitedUntil) return;
+    if (!conversationId) {
+        const created = await fetch(apiPrefix, {method: "POST"}).then((r) => r.json());
+        conversationId = created.uuid;
+        history.replaceState(null, "", "/chat/" + conversationId);
+    }
+    editor.innerText = "";
+    addUserMessage(prompt);
+    streaming = true;
+    updateSendButton();
+    showStopButton(true);
+    const {message, body} = addAssistantMessage("", []);
+    message.setAttribute("data-is-streaming", "true");
+    const blocks = {};
+    try {
+        const response = await fetch(`${apiPrefix}/${conversationId}/completion`, {
+            method: "POST", headers: {"Content-Type": "application/json"}, body: JSON.stringify({prompt}),
+        });
+        if (response.status === 429) {
+            const error = await response.json();
+            message.remove();
+            showLimit(error.resets_at);
+            return;
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+            const {value, done} = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, {stream: true});
+            let end;
+            while ((end = buffer.indexOf("\n\n")) >= 0) {
+                const chunk = buffer.slice(0, end);
+                buffer = buffer.slice(end + 2);
+                const dataLine = chunk.split("\n").find((line) => line.startsWith("data:"));
+                if (!dataLine) continue;
+                const data = JSON.parse(dataLine.slice(5));
+                if (data.type === "content_block_start") {
+                    blocks[data.index] = {block: data.content_block, json: "", progress: null};
+                    if (data.content_block.type === "tool_use") {
+                        blocks[data.index].progress = document.createElement("div");
+                        message.appendChild(blocks[data.index].progress);
+                    }
+                } else if (data.type === "content_block_delta") {
+                    if (data.delta.type === "text_delta") body.textContent += data.delta.text;
+                    if (data.delta.type === "input_json_delta") {
+                        blocks[data.index].json += data.delta.partial_json;
+                        blocks[data.index].progress.textContent = `Writing... ${blocks[data.index].json.length} characters`;
+                    }
+                } else if (data.type === "content_block_stop") {
+                    const block = blocks[data.index];
+                    if (block && block.block.type === "tool_use") {
+                        block.progress.remove();
+                        addArtifact(message, JSON.parse(block.json));
+                    }
+                } else if (data.type === "message_limit" && data.resets_at) {
+                    showLimit(data.resets_at);
+                } else if (data.type === "conversation_name") {
+                    document.getElementById("chat-title").textContent = data.name;
+                }
+            }
+        }
+    } catch (error) {
+        body.textContent += "\n[stream error]";
+    } finally {
+        streaming = false;
+        message.setAttribute("data-is-streaming", "false");
+        showStopButton(false);
+        updateSendButton();
+    }
+}
+
+editor.addEventListener("input", updateSendButton);
+editor.addEventListener("paste", (event) => {
+    event.preventDefault();
+    document.execCommand("insertText", false, event.clipboardData.getData("text/plain"));
+    updateSendButton();
+});
+editor.addEventListener("keydown", (event) => {
+    if (event.key === "Enter" && !event.shiftKey) {
+        event.preventDefault();
+        send();
+    }
+});
+sendButton.addEventListener("click", send);
+
+(async () => {
+    const state = await fetch(conversationId ? `${apiPrefix}/${conversationId}` : apiPrefix + "/state").then((r) => r.json());
+    if (state.name) document.getElementById("chat-title").textContent = state.name;
+    (state.messages || []).forEach((m) => m.sender === "human" ? addUserMessage(m.text) : addAssistantMessage(m.text, m.artifacts));
+    showLimit(state.resets_at || null);
+})();
+</script>
+</body>
+</html>
+"""
+
+
+class MockClaudeState:
+    """Conversations and failure injection shared by all requests"""
+
+    def __init__(self, options:dict):
+        self.options = {**DEFAULT_OPTIONS, **options}
+        self.lock = threading.Lock()
+        self.conversations = {}
+        self.message_count = 0
+        self.limited_until = None
+        self.random = random.Random(self.options.get("seed"))
+
+    def create_conversation(self)->str:
+        conversation_id = str(uuid.uuid4())
+        with self.lock:
+            self.conversations[conversation_id] = {"name": "", "messages": [], "chapters": 0}
+        return conversation_id
+
+    def resets_at(self):
+        """Get the reactivation time shown in the limit banner, or None if there is no limit"""
+        with self.lock:
+            if self.limited_until is None or time.time() >= self.limited_until:
+                self.limited_until = None
+                return None
+            return datetime.datetime.fromtimestamp(self.limited_until).strftime("%I:%M %p").lstrip("0")
+
+    def count_message(self):
+        """Count a message and start the limit once limit_after messages were sent"""
+        with self.lock:
+            self.message_count += 1
+            limit_after = self.options["limit_after"]
+            if limit_after and self.message_count % limit_after == 0:
+                self.limited_until = time.time() + self.options["limit_seconds"]
+
+    def chapter_text(self, number:int)->str:
+        words = [self.random.choice(WORDS) for _ in range(self.options["chapter_words"])]
+        paragraphs = [" ".join(words[i:i + 80]).capitalize() + "." for i in range(0, len(words), 80)]
+        return f"# Chapter {number}\n\n" + "\n\n".join(paragraphs) + "\n"
+
+
+def sse(event:dict)->bytes:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+
+
+class MockClaudeHandler(BaseHTTPRequestHandler):
+    state = None  # Set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status:int=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_page(self, conversation_id):
+        body = (APP_HTML.replace("__API_PREFIX__", API_PREFIX)
+                .replace("__CONVERSATION_ID__", json.dumps(conversation_id))).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        chat = re.fullmatch(r"/chat/([\w-]+)", path)
+        conversation = re.fullmatch(API_PREFIX + r"/([\w-]+)", path)
+        if path == API_PREFIX + "/state":
+            self.send_json({"resets_at": self.state.resets_at()})
+        elif conversation:
+            data = self.state.conversations.get(conversation.group(1))
+            if data is None:
+                self.send_json({"error": "not found"}, 404)
+            else:
+                self.send_json({"name": data["name"], "messages": data["messages"], "resets_at": self.state.resets_at()})
+        elif chat:
+            self.send_page(chat.group(1))
+        elif path in ("/", "/projects") or path.startswith("/project/") or path == "/new":
+            self.send_page(None)
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        completion = re.fullmatch(API_PREFIX + r"/([\w-]+)/completion", path)
+        if path == API_PREFIX:
+            self.send_json({"uuid": self.state.create_conversation()})
+        elif completion and completion.group(1) in self.state.conversations:
+            length = int(self.headers.get("Content-Length", 0))
+            prompt = json.loads(self.rfile.read(length) or b"{}").get("prompt", "")
+            self.stream_completion(self.state.conversations[completion.group(1)], prompt)
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def stream_completion(self, conversation:dict, prompt:str):
+        state = self.state
+        options = state.options
+        resets_at = state.resets_at()
+        if resets_at:
+            self.send_json({"error": "limit reached", "resets_at": resets_at}, 429)
+            return
+        state.count_message()
+        conversation["messages"].append({"sender": "human", "text": prompt})
+
+        # The first message sets up the story, every later one writes a chapter artifact
+        artifact = None
+        if any(message["sender"] == "assistant" for message in conversation["messages"]):
+            conversation["chapters"] += 1
+            number = conversation["chapters"]
+            artifact = {"id": f"chapter-{number}", "command": "create", "type": "text/markdown",
+                        "title": f"Chapter {number}", "content": state.chapter_text(number)}
+        text = "Here is the next chapter." if artifact else "I'll write this story chapter by chapter."
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        events = [{"type": "message_start"},
+                  {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                  {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}},
+                  {"type": "content_block_stop", "index": 0}]
+        if artifact:
+            payload = json.dumps(artifact)
+            events.append({"type": "content_block_start", "index": 1, "content_block": {"type": "tool_use", "name": "artifacts", "input": {}}})
+            events += [{"type": "content_block_delta", "index": 1, "delta": {"type": "input_json_delta", "partial_json": payload[i:i + 64]}}
+                       for i in range(0, len(payload), 64)]
+            events.append({"type": "content_block_stop", "index": 1})
+        if not conversation["name"]:
+            conversation["name"] = "Mock Story"
+            events.append({"type": "conversation_name", "name": conversation["name"]})
+        events.append({"type": "message_stop"})
+
+        stall_at = len(events) // 2 if state.random.random() < options["stall_rate"] else None
+        error_at = len(events) // 2 if state.random.random() < options["error_rate"] else None
+        delay_per_event = 64 / options["chars_per_second"]
+        try:
+            time.sleep(options["first_token_delay"])
+            for i, event in enumerate(events):
+                if i == error_at:
+                    return  # Cut the stream off, the artifact never arrives
+                if i == stall_at:
+                    time.sleep(options["stall_seconds"])
+                self.wfile.write(sse(event))
+                self.wfile.flush()
+                time.sleep(delay_per_event)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        conversation["messages"].append({"sender": "assistant", "text": text,
+                                         "artifacts": [{"title": artifact["title"], "content": artifact["content"]}] if artifact else []})
+        limit = state.resets_at()
+        if limit:
+            self.wfile.write(sse({"type": "message_limit", "resets_at": limit}))
+
+
+def make_server(port:int=0, **options)->ThreadingHTTPServer:
+    """Create the mock server (port 0 picks a free port) without starting it"""
+    handler = type("Handler", (MockClaudeHandler,), {"state": MockClaudeState(options)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_mock_server(port:int=0, **options)->ThreadingHTTPServer:
+    """Start the mock server in a background thread. Its URL is http://127.0.0.1:<server.server_port>"""
+    server = make_server(port, **options)
+    threading.Thread(target=server.serve_forever, name="mock-claude", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Claude web app")
+    parser.add_argument("--port", type=int, default=8765)
+    for name, default in DEFAULT_OPTIONS.items():
+        parser.add_argument("--" + name.replace("_", "-"), type=type(default), default=default)
+    parser.add_argument("--seed", type=int, default=None)
+    args = vars(parser.parse_args())
+    port = args.pop("port")
+    server = make_server(port, **args)
+    print(f"Mock Claude running at http://127.0.0.1:{server.server_port}/project/mock")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Local file server for page snapshots recorded with the "record_snapshots" config option.
+
+Every snapshot is served at /snapshot/<id> as the recorded page, plus a small script that
+switches the artifact panel when an artifact button is clicked, so the extraction code sees
+the same DOM as in the live run. Browse them with
+`python benchmarks/replay_server.py --snapshots snapshots --port 8766`, or start the server
+from a benchmark with start_replay_server().
+"""
+import os
+import re
+import sys
+import json
+import html
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from modules.snapshots import SNAPSHOT_DIR, snapshot_path, load_snapshot, list_snapshots
+
+
+DEFAULT_PANEL_DELAY_MS = 50  # How long the replayed app takes to show a panel after a click
+
+# Replays the artifact panels: a click on a recorded artifact button swaps the recorded
+# panel HTML in place of the open panel, and the copy button copies the panel's text.
+REPLAY_SCRIPT = """
+<script>
+(function () {
+    const panels = __PANELS__;
+    const panelDelayMs = __PANEL_DELAY_MS__;
+    function showPanel(index) {
+        const panelHtml = panels[index];
+        if (!panelHtml) return;
+        setTimeout(() => {
+            const template = document.createElement("template");
+            template.innerHTML = panelHtml;
+            const panel = template.content.firstElementChild;
+            panel.setAttribute("data-replay-panel", "");
+            const current = document.querySelector("[data-replay-panel]");
+            if (current) current.replaceWith(panel);
+            else document.body.appendChild(panel);
+        }, panelDelayMs);
+    }
+    document.addEventListener("click", (event) => {
+        const button = event.target.closest("[data-replay-artifact]");
+        if (button) {
+            event.preventDefault();
+            showPanel(button.getAttribute("data-replay-artifact"));
+            return;
+        }
+        const copy = event.target.closest("[data-replay-copy]");
+        const panel = document.querySelector("[data-replay-panel]");
+        if (copy && panel && navigator.clipboard) {
+            navigator.clipboard.writeText(panel.innerText).catch(() => {});
+        }
+    }, true);
+})();
+</script>
+"""
+
+
+def script_json(data)->str:
+    """JSON that can't end the <script> element it is embedded in"""
+    return json.dumps(data).replace("<", "\\u003c")
+
+
+def replay_page(snapshot:dict, panel_delay_ms:int=DEFAULT_PANEL_DELAY_MS)->str:
+    """Get the recorded page with the replay script added"""
+    script = REPLAY_SCRIPT.replace("__PANELS__", script_json(snapshot["panels"])).replace("__PANEL_DELAY_MS__", str(int(panel_delay_ms)))
+    page = snapshot["html"]
+    end = page.lower().rfind("</body>")
+    return page[:end] + script + page[end:] if end != -1 else page + script
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    directory = SNAPSHOT_DIR  # Set by make_server
+    panel_delay_ms = DEFAULT_PANEL_DELAY_MS
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body:str, content_type:str, status:int=200):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        page = re.fullmatch(r"/snapshot/([\w.-]+)", path)
+        if path == "/":
+            links = "".join(f'<li><a href="/snapshot/{html.escape(name)}">{html.escape(name)}</a></li>'
+                            for name in (os.path.basename(p)[:-len(".json.gz")] for p in list_snapshots(self.directory)))
+            self.send_body(f"<!DOCTYPE html><html><body><ul>{links}</ul></body></html>", "text/html; charset=utf-8")
+        elif page and os.path.exists(snapshot_path(self.directory, page.group(1))):
+            snapshot = load_snapshot(snapshot_path(self.directory, page.group(1)))
+            self.send_body(replay_page(snapshot, self.panel_delay_ms), "text/html; charset=utf-8")
+        else:
+            self.send_body(json.dumps({"error": "not found"}), "application/json", 404)
+
+
+def make_server(directory:str=SNAPSHOT_DIR, port:int=0, panel_delay_ms:int=DEFAULT_PANEL_DELAY_MS)->ThreadingHTTPServer:
+    """Create the replay server (port 0 picks a free port) without starting it"""
+    handler = type("Handler", (ReplayHandler,), {"directory": directory, "panel_delay_ms": panel_delay_ms})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_replay_server(directory:str=SNAPSHOT_DIR, port:int=0, panel_delay_ms:int=DEFAULT_PANEL_DELAY_MS)->ThreadingHTTPServer:
+    """Start the replay server in a background thread. Snapshots are at http://127.0.0.1:<server.server_port>/snapshot/<id>"""
+    server = make_server(directory, port, panel_delay_ms)
+    threading.Thread(target=server.serve_forever, name="replay-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded page snapshots")
+    parser.add_argument("--snapshots", default=SNAPSHOT_DIR, help="Folder with the recorded snapshots")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--panel-delay-ms", type=int, default=DEFAULT_PANEL_DELAY_MS)
+    args = parser.parse_args()
+    server = make_server(args.snapshots, args.port, args.panel_delay_ms)
+    print(f"Serving {len(list_snapshots(args.snapshots))} snapshots at http://127.0.0.1:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
 import json
 import shutil
+from modules.config_options import INPUT_MODES, CAPTURE_MODES
+from modules.storage import STORAGE_KINDS
 
 def create_config_helper():
     """Main function to create or update a configuration file"""
@@ -265,6 +267,104 @@ def create_config_file(config_name):
         
         config["generation_prompts"].append(chapter_prompt)
     
+    # Input mode
+    print("\n" + "-" * 40)
+    print("⌨️ INPUT MODE")
+    print("-" * 40)
+    print("How prompts are entered into Claude's editor:")
+    descriptions = {"insert": "paste the whole prompt in one go (fastest)",
+                    "chunked": "type the prompt in large chunks",
+                    "human": "type one character at a time (slowest, original behaviour)"}
+    for i, mode in enumerate(INPUT_MODES, 1):
+        print(f"{i}. {mode:<7} - {descriptions.get(mode, '')}")
+    default = config.get("input_mode", "human")
+    print(f"Current value: {default}")
+    mode_choice = input(f"Select input mode (1-{len(INPUT_MODES)}, press Enter to keep current): ").strip()
+    if mode_choice.isdigit() and 1 <= int(mode_choice) <= len(INPUT_MODES):
+        config["input_mode"] = INPUT_MODES[int(mode_choice) - 1]
+    else:
+        config["input_mode"] = default
+    
+    # Capture mode
+    print("\n" + "-" * 40)
+    print("📥 CAPTURE MODE")
+    print("-" * 40)
+    print("How finished artifacts are collected:")
+    descriptions = {"dom": "click each artifact and copy it from the page (original behaviour)",
+                    "batch": "read all artifacts from the page in a single call",
+                    "cdp": "rebuild artifacts from the network stream (no clicking or clipboard)"}
+    for i, mode in enumerate(CAPTURE_MODES, 1):
+        print(f"{i}. {mode} - {descriptions.get(mode, '')}")
+    default = config.get("capture_mode", "dom")
+    print(f"Current value: {default}")
+    mode_choice = input(f"Select capture mode (1-{len(CAPTURE_MODES)}, press Enter to keep current): ").strip()
+    if mode_choice.isdigit() and 1 <= int(mode_choice) <= len(CAPTURE_MODES):
+        config["capture_mode"] = CAPTURE_MODES[int(mode_choice) - 1]
+    else:
+        config["capture_mode"] = default
+    
+    # Pipelining
+    print("\n" + "-" * 40)
+    print("⏩ PIPELINING")
+    print("-" * 40)
+    print("Download the previous video in a second tab while the next one is being generated.")
+    default = config.get("pipeline", False)
+    print(f"Current value: {'yes' if default else 'no'}")
+    pipeline_choice = input("Enable pipelining? (y/n, press Enter to keep current): ").strip().lower()
+    config["pipeline"] = pipeline_choice == 'y' if pipeline_choice in ('y', 'n') else default
+    
+    # Humanize
+    print("\n" + "-" * 40)
+    print("🧍 HUMANIZE")
+    print("-" * 40)
+    print("Add human-like pauses around clicks and page loads. When off, the automation waits")
+    print("only until each action has finished, plus a short random jitter.")
+    default = config.get("humanize", False)
+    print(f"Current value: {'yes' if default else 'no'}")
+    humanize_choice = input("Humanize pacing? (y/n, press Enter to keep current): ").strip().lower()
+    config["humanize"] = humanize_choice == 'y' if humanize_choice in ('y', 'n') else default
+    
+    # Incremental capture
+    print("\n" + "-" * 40)
+    print("🧷 INCREMENTAL CAPTURE")
+    print("-" * 40)
+    print("Save each chapter as soon as its response finishes, so a crash keeps the chapters written so far.")
+    default = config.get("incremental", False)
+    print(f"Current value: {'yes' if default else 'no'}")
+    incremental_choice = input("Enable incremental capture? (y/n, press Enter to keep current): ").strip().lower()
+    config["incremental"] = incremental_choice == 'y' if incremental_choice in ('y', 'n') else default
+    
+    # Storage
+    print("\n" + "-" * 40)
+    print("💾 STORAGE")
+    print("-" * 40)
+    print("Where chapters are saved:")
+    descriptions = {"files": "one Chapter-N.txt file per chapter (original behaviour)",
+                    "sqlite": "all chapters compressed in outputFiles/chapters.sqlite",
+                    "jsonl": "one compressed archive per run in outputFiles/"}
+    for i, kind in enumerate(STORAGE_KINDS, 1):
+        print(f"{i}. {kind} - {descriptions.get(kind, '')}")
+    print("Archives can be exported to files with: python -m modules.storage export <path>")
+    default = config.get("storage", "files")
+    print(f"Current value: {default}")
+    storage_choice = input(f"Select storage (1-{len(STORAGE_KINDS)}, press Enter to keep current): ").strip()
+    if storage_choice.isdigit() and 1 <= int(storage_choice) <= len(STORAGE_KINDS):
+        config["storage"] = STORAGE_KINDS[int(storage_choice) - 1]
+    else:
+        config["storage"] = default
+    
+    # Post-processing
+    print("\n" + "-" * 40)
+    print("🧮 POST-PROCESSING")
+    print("-" * 40)
+    print("While later videos are generated, strip the markdown from finished videos, check them for")
+    print("missing, truncated or duplicated chapters, count their words and merge them into Full-Script.txt.")
+    print("Every video gets a manifest.json next to its chapters.")
+    default = config.get("postprocess", False)
+    print(f"Current value: {'yes' if default else 'no'}")
+    postprocess_choice = input("Post-process finished videos? (y/n, press Enter to keep current): ").strip().lower()
+    config["postprocess"] = (default or True) if postprocess_choice == 'y' else False if postprocess_choice == 'n' else default
+    
     # Review config before saving
     print("\n" + "=" * 60)
     print(" CONFIGURATION REVIEW ".center(60, "="))
@@ -274,6 +374,13 @@ def create_config_file(config_name):
     print(f"Text Placeholder: {config['text_to_be_replaced_by_video_number']}")
     print(f"Initial Prompt: {config['initial_prompt'][:50]}..." if len(config['initial_prompt']) > 50 else f"Initial Prompt: {config['initial_prompt']}")
     print(f"Number of Chapters: {len(config['generation_prompts'])}")
+    print(f"Input Mode: {config['input_mode']}")
+    print(f"Capture Mode: {config['capture_mode']}")
+    print(f"Pipelining: {'yes' if config['pipeline'] else 'no'}")
+    print(f"Humanize: {'yes' if config['humanize'] else 'no'}")
+    print(f"Incremental Capture: {'yes' if config['incremental'] else 'no'}")
+    print(f"Storage: {config['storage']}")
+    print(f"Post-processing: {'yes' if config['postprocess'] is True else ', '.join(config['postprocess']) if config['postprocess'] else 'no'}")
     
     save = input("\nSave this configuration? (y/n): ")
     if save.lower() != 'y':
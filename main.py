@@ -1,16 +1,30 @@
-import traceback
-from seleniumbase import Driver
+import os
 import sys
-from modules.automation_parts import *
 import json
+import logging
+import argparse
+import traceback
+from modules.config_options import INPUT_MODES, CAPTURE_MODES
+from modules.storage import STORAGE_KINDS
+from modules.postprocess import PostProcessor, transform_names, check_transforms
+from modules.journal import Journal
+from modules.output_index import OutputIndex, INDEX_PATH
+from modules.tracing import start_tracing, stop_tracing, print_summary
+from modules.logs import setup_logging, shutdown_logging, video_finished
+from modules import wakeup
+
 
+def list_accounts()->list:
+    return [f for f in os.listdir("accounts") if os.path.isdir(os.path.join("accounts", f))] if os.path.isdir("accounts") else []
 
 
+def list_configs()->list:
+    return [f for f in os.listdir("configs") if os.path.isdir(os.path.join("configs", f))] if os.path.isdir("configs") else []
 
 
-def select_account():
-    """Select an account for login"""
-    accounts = [f for f in os.listdir("accounts") if os.path.isdir(os.path.join("accounts", f))]
+def select_accounts():
+    """Select one or more accounts for login"""
+    accounts = list_accounts()
     if not accounts:
         print("No accounts found in the 'accounts' directory.")
         sys.exit(1)
@@ -20,13 +34,18 @@ def select_account():
     for i, account in enumerate(accounts):
         print(f"{i + 1}. {account}")
     print("-" * 50)
+    print("Select several accounts (eg 1,3) or 'all' to run them in parallel.")
 
     while True:
-        choice = input("Select an account (1-{}): ".format(len(accounts)))
-        if choice.isdigit() and 1 <= int(choice) <= len(accounts):
-            selected_account = accounts[int(choice) - 1]
-            print(f"Selected account: {selected_account}")
-            return selected_account
+        choice = input("Select an account (1-{}): ".format(len(accounts))).strip()
+        if choice.lower() == "all":
+            choices = [str(i + 1) for i in range(len(accounts))]
+        else:
+            choices = [c.strip() for c in choice.split(",")]
+        if all(c.isdigit() and 1 <= int(c) <= len(accounts) for c in choices):
+            selected_accounts = list(dict.fromkeys(accounts[int(c) - 1] for c in choices))
+            print(f"Selected accounts: {', '.join(selected_accounts)}")
+            return selected_accounts
         else:
             print("Invalid choice.")
 
@@ -38,7 +57,7 @@ def select_config():
         print("Created 'configs' directory. Please add config folders with config.json files.")
         sys.exit(1)
         
-    configs = [f for f in os.listdir("configs") if os.path.isdir(os.path.join("configs", f))]
+    configs = list_configs()
     if not configs:
         print("No configuration folders found in the 'configs' directory.")
         sys.exit(1)
@@ -82,6 +101,17 @@ def load_config(config_name):
             for field in required_fields:
                 if field not in config:
                     raise KeyError(f"Missing required field: {field}")
+            # Validate optional fields
+            if config.get("input_mode", "human") not in INPUT_MODES:
+                raise KeyError(f"Invalid input_mode: {config['input_mode']} (expected one of {', '.join(INPUT_MODES)})")
+            if config.get("capture_mode", "dom") not in CAPTURE_MODES:
+                raise KeyError(f"Invalid capture_mode: {config['capture_mode']} (expected one of {', '.join(CAPTURE_MODES)})")
+            if config.get("storage", "files") not in STORAGE_KINDS:
+                raise KeyError(f"Invalid storage: {config['storage']} (expected one of {', '.join(STORAGE_KINDS)})")
+            try:
+                check_transforms(transform_names(config))
+            except ValueError as e:
+                raise KeyError(str(e))
             return config
     except FileNotFoundError:
         print(f"Config file not found: {config_path}")
@@ -94,13 +124,141 @@ def load_config(config_name):
         return None
 
 
+def parse_video_set(expression:str)->list:
+    """Parse a video set like '1-15,22,40-60' into a sorted list of video numbers"""
+    video_numbers = set()
+    for part in expression.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            if not (start.strip().isdigit() and end.strip().isdigit()) or int(start) > int(end):
+                raise ValueError(f"Invalid video range: {part}")
+            video_numbers.update(range(int(start), int(end) + 1))
+        elif part.isdigit():
+            video_numbers.add(int(part))
+        else:
+            raise ValueError(f"Invalid video number: {part}")
+    if not video_numbers:
+        raise ValueError("No video numbers given")
+    return sorted(video_numbers)
+
+
+EXIT_OK = 0
+EXIT_VIDEOS_FAILED = 1
+EXIT_INVALID_JOB = 2
+EXIT_NO_WORKERS = 3
+
+
+def load_job(args)->dict:
+    """Build the job spec from a job file and/or command line options (options win)"""
+    job = {}
+    if args.job:
+        with open(args.job, "r") as f:
+            job = json.load(f)
+    for key in ("accounts", "config", "videos", "concurrency", "queue"):
+        if getattr(args, key) is not None:
+            job[key] = getattr(args, key)
+    if args.headless:
+        job["headless"] = True
+    # With a shared queue the videos come from the queue, so they are optional
+    for key in ("accounts", "config") if job.get("queue") else ("accounts", "config", "videos"):
+        if not job.get(key):
+            raise ValueError(f"Missing '{key}' in the job spec")
+
+    available = list_accounts()
+    accounts = job["accounts"]
+    if accounts == "all":
+        accounts = available
+    elif isinstance(accounts, str):
+        accounts = [account.strip() for account in accounts.split(",") if account.strip()]
+    unknown = [account for account in accounts if account not in available]
+    if unknown:
+        raise ValueError(f"Unknown accounts: {', '.join(unknown)}")
+    if job.get("concurrency"):
+        accounts = accounts[:int(job["concurrency"])]
+
+    videos = job.get("videos") or []
+    video_numbers = parse_video_set(videos) if isinstance(videos, str) else sorted({int(v) for v in videos})
+    return {"accounts": accounts, "config": job["config"], "videos": video_numbers, "headless": bool(job.get("headless", False)),
+            "queue": job.get("queue")}
+
+
+def run_job(job:dict)->int:
+    """Run a job without asking anything. Returns the process exit code"""
+    config_name = job["config"]
+    config = load_config(config_name)
+    if not config:
+        return EXIT_INVALID_JOB
+    video_numbers = job["videos"]
+    work_queue = None
+    if job["queue"]:
+        from modules.work_queue import open_queue
+        work_queue = open_queue(job["queue"])
+        print(f"Job: config {config_name}, accounts {', '.join(job['accounts'])}, videos from the queue {job['queue']}")
+    else:
+        print(f"Job: config {config_name}, accounts {', '.join(job['accounts'])}, {len(video_numbers)} videos")
+    if config["text_to_be_replaced_by_video_number"] not in config["initial_prompt"]:
+        print(f"Warning: '{config['text_to_be_replaced_by_video_number']}' not found in the initial prompt.")
+
+    # The browser stack is only imported once a run actually starts
+    from modules.worker_pool import AccountWorker, start_workers, run_pool
+    from modules.driver_pool import DriverPool
+
+    trace_path = start_tracing()
+    print(f"Writing timings to {trace_path}")
+    driver_pool = DriverPool()
+    driver_pool.prelaunch(job["accounts"], config.get("capture_mode", "dom"), job["headless"], config.get("persistent_profile", True))
+    # Finished videos are post-processed in other processes while the next ones are generated
+    postprocessor = PostProcessor(config, config_name) if transform_names(config) else None
+    workers = start_workers([AccountWorker(account, config_name, config, job["headless"], driver_pool, interactive=False, postprocessor=postprocessor)
+                             for account in job["accounts"]])
+    driver_pool.close()
+    if not workers:
+        if postprocessor is not None:
+            postprocessor.close()
+        shutdown_logging()
+        print("No account could be started.")
+        stop_tracing()
+        return EXIT_NO_WORKERS
+
+    finished = []
+
+    def report(video_number, result):
+        finished.append(video_number)
+        status = "failed: " + result["error"] if result["error"] else "done"
+        video_finished(bool(result["error"]))
+        print(f"[{len(finished)}/{len(video_numbers) or '?'}] Video {video_number} {status} ({result['account']})", flush=True)
+        logging.info(f"Video {video_number} {status} ({result['account']})")
+
+    try:
+        results = run_pool(workers, video_numbers, Journal(), on_result=report, work_queue=work_queue)
+    finally:
+        for worker in workers:
+            worker.close()
+        if postprocessor is not None:
+            postprocessor.close()
+        stop_tracing()
+        # Give the console back in quiet mode and write out the queued log records
+        shutdown_logging()
+        print_summary(trace_path)
+
+    failed = [video_number for video_number, result in results.items() if result["error"]]
+    print(f"Processed {len(results) - len(failed)} of {len(results) if work_queue else len(video_numbers)} videos.")
+    if failed:
+        print(f"Failed videos: {', '.join(str(video_number) for video_number in failed)}")
+        return EXIT_VIDEOS_FAILED
+    return EXIT_OK
+
+
 def claude_automation():
     print("\n" + "=" * 80)
     print(" Claude AI Automation ".center(80, "="))
     print("=" * 80 + "\n")
 
-    # Select account and config separately
-    account = select_account()
+    # Select accounts and config separately
+    accounts = select_accounts()
     config_name = select_config()
     
     # Load and validate the configuration
@@ -109,60 +267,57 @@ def claude_automation():
         print("Failed to load valid configuration. Exiting.")
         return
 
+    # Start the browsers while the remaining questions are answered
+    from modules.worker_pool import AccountWorker, start_workers, run_pool
+    from modules.driver_pool import DriverPool
+    driver_pool = DriverPool()
+    driver_pool.prelaunch(accounts, config.get("capture_mode", "dom"), persistent_profile=config.get("persistent_profile", True))
+
+    if config["text_to_be_replaced_by_video_number"] not in config["initial_prompt"]:
+        print(f"Warning: '{config['text_to_be_replaced_by_video_number']}' not found in the initial prompt.")
+        input("Press Enter to continue...")
+
     while True:
         try:
-            video_numbers = input("Enter the video numbers (range eg 1-15): ").split("-")
-            if len(video_numbers) != 2:
-                raise ValueError("Invalid input")
-            print(f"Selected video numbers: {video_numbers[0]} to {video_numbers[1]}\ni.e. {[i for i in range(int(video_numbers[0]), int(video_numbers[1]) + 1)]}")
+            video_numbers = parse_video_set(input("Enter the video numbers (range eg 1-15, or a set eg 1-15,22,40-60): "))
+            print(f"Selected video numbers: {video_numbers}")
             break
         except Exception as e:
             print(f"Error: {e}. Please enter the video numbers in the format 'start-end'.")
             logging.info(traceback.format_exc())
     
-    # Initialize the browser
-    driver = Driver(uc=True, headless=False,)
-    driver.maximize_window()
+    print(f"Prompt input mode: {config.get('input_mode', 'human')}")
 
-    # Handle login
-    handle_login(driver, account)
-    print("Login successful!")
+    # Every phase is timed into a trace file that is summarized at the end
+    trace_path = start_tracing()
+    print(f"Writing timings to {trace_path}")
+
+    # Initialize one browser per account and log in
+    postprocessor = PostProcessor(config, config_name) if transform_names(config) else None
+    workers = start_workers([AccountWorker(account, config_name, config, driver_pool=driver_pool, postprocessor=postprocessor) for account in accounts])
+    driver_pool.close()
+    if not workers:
+        if postprocessor is not None:
+            postprocessor.close()
+        print("No account could be started. Exiting.")
+        stop_tracing()
+        return
+    if len(workers) > 1:
+        print(f"Running {len(workers)} accounts in parallel: {', '.join(worker.account for worker in workers)}")
     
+    # Finished steps are journaled so interrupted videos resume and finished ones are skipped
+    journal = Journal()
+
     # Main automation loop
     continue_generation = True
     try:
         while continue_generation:
             try:
-                for video_number in video_numbers:
-                    
-                    print(f"Processing video number: {video_number}")
-                    driver.get(config["project_link"])
-
-                    text_to_be_replaced = config["text_to_be_replaced_by_video_number"]
-                    initial_prompt = config["initial_prompt"]
-
-                    if text_to_be_replaced in initial_prompt:
-                        initial_prompt = initial_prompt.replace(text_to_be_replaced, str(video_number))
-                    else:
-                        print(f"Warning: '{text_to_be_replaced}' not found in the initial prompt.")
-                        input("Press Enter to continue...")
-                    
-                    print(f"Entering Initial Prompt: {initial_prompt}")
-                    enter_prompt(driver, initial_prompt)
-                    
-
-                    wait_for_response(driver)
-
-                    generation_prompts = config["generation_prompts"]
-                    for i, prompt in enumerate(generation_prompts):
-                        print(f"Entering Prompt {i+1}: {prompt}")
-                        
-                        enter_prompt(driver, prompt)
-
-                        wait_for_response(driver)
-                    
-                    output_dir = account+"-"+config_name
-                    download_artifacts(driver, str(video_number), output_dir)
+                results = run_pool(workers, video_numbers, journal)
+                failed = [video_number for video_number, result in results.items() if result["error"]]
+                print(f"Processed {len(results) - len(failed)} of {len(video_numbers)} videos.")
+                if failed:
+                    print(f"Failed videos: {', '.join(str(video_number) for video_number in failed)}")
             except Exception as e:
                 print(f"An error occurred: {e}")
                 logging.info(traceback.format_exc())
@@ -189,10 +344,59 @@ def claude_automation():
                 continue_generation = False
                 print("Exiting the program.")
     finally:
-        save_cookies(driver, account)
-        driver.quit()
+        for worker in workers:
+            worker.close()
+        if postprocessor is not None:
+            postprocessor.close()
+        stop_tracing()
+        print_summary(trace_path)
+
+
 
+def main()->int:
+    parser = argparse.ArgumentParser(description="Claude AI Automation. Runs interactively unless a job is given.")
+    parser.add_argument("--job", help="JSON job spec with accounts, config, videos, concurrency, headless and queue")
+    parser.add_argument("--accounts", help="Comma separated account names, or 'all'")
+    parser.add_argument("--config", help="Configuration name")
+    parser.add_argument("--videos", help="Video set, eg 1-15,22,40-60")
+    parser.add_argument("--queue", help="Shared work queue (SQLite file or tcp://host:port) to take videos from; --videos are added to it")
+    parser.add_argument("--concurrency", type=int, help="Maximum number of accounts to run in parallel")
+    parser.add_argument("--headless", action="store_true", help="Run the browsers headless")
+    parser.add_argument("--list", action="store_true", help="List the accounts and configurations and exit")
+    parser.add_argument("--check", action="store_true", help="Validate the job and its configuration without running it")
+    parser.add_argument("--quiet", action="store_true", help="Job runs only: log status lines instead of printing them, with a progress summary every 30 seconds")
+    args = parser.parse_args()
+
+    if args.list:
+        print("Accounts: " + (", ".join(list_accounts()) or "none"))
+        print("Configurations: " + (", ".join(list_configs()) or "none"))
+        return EXIT_OK
+
+    wakeup.install_signal_handler()
+    if not any([args.job, args.accounts, args.config, args.videos, args.queue]):
+        setup_logging()
+        claude_automation()
+        return EXIT_OK
+
+    try:
+        job = load_job(args)
+    except (OSError, ValueError) as e:
+        print(f"Invalid job: {e}")
+        return EXIT_INVALID_JOB
+    if args.check:
+        if not load_config(job["config"]):
+            return EXIT_INVALID_JOB
+        print(f"Job is valid: config {job['config']}, accounts {', '.join(job['accounts'])}, "
+              + (f"videos from the queue {job['queue']}" if job["queue"] else f"{len(job['videos'])} videos"))
+        if job["videos"] and os.path.exists(INDEX_PATH):
+            print(f"{len(OutputIndex().done(job['config'], job['videos']))} of them are already in {INDEX_PATH}")
+        return EXIT_OK
+    setup_logging(quiet=args.quiet, total_videos=len(job["videos"]) or None)
+    return run_job(job)
 
 
 if __name__ == "__main__":
-    claude_automation()
\ No newline at end of file
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()  # The post-processing pool needs this in main.exe
+    sys.exit(main())
\ No newline at end of file
@@ -1,12 +1,12 @@
 import pickle
+import json
 import os
 import time
+import datetime
 import random
 import traceback
 from typing import Optional
-import pyperclip
 import sys
-import msvcrt  
 from selenium import webdriver
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
@@ -15,8 +15,26 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException
 
+from modules.retry import retry_step, get_retry_policy
+from modules.tracing import span, record_span, trace_context
+from modules.locators import find, find_all, exists, wait_for, wait_for_all, cached, js_selectors, probe, wait_for_probe, FIND_JS
+from modules import pacing, wakeup, snapshots
+from modules.config_options import INPUT_MODES, CAPTURE_MODES
+from modules.storage import FileStore, VideoOutput, get_store, content_hash, MIN_CHAPTER_CHARS, MIN_CHAPTER_RATIO
+
 import logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filename='automation.log', filemode='a')
+
+
+class StepError(Exception):
+    """Raised when a step of the automation fails and may be retried"""
+
+
+class SessionExpiredError(StepError):
+    """Raised when a page redirects to the login page"""
+
+
+class LoginRequiredError(Exception):
+    """Raised instead of asking for a manual login when running unattended"""
 
 
 def clean_file_name(file_name:str)->str:
@@ -33,6 +51,49 @@ def js_click_element(driver:webdriver.Chrome, element):
     driver.execute_script("arguments[0].click();", element)
 
 
+SESSION_TTL_SECONDS = 6*60*60  # How long a checked login is trusted without checking again
+
+
+def profile_dir(account:str)->str:
+    """Get the persistent Chrome user data directory of an account"""
+    return os.path.abspath(os.path.join("accounts", account, "chrome_profile"))
+
+
+def launch_driver(capture_mode:str="dom", headless:bool=False, account:Optional[str]=None)->webdriver.Chrome:
+    """Start a new undetected Chrome instance, using the account's persistent profile if an account is given"""
+    from seleniumbase import Driver  # Slow to import, so only loaded when a browser is needed
+    driver = Driver(uc=True, headless=headless, log_cdp_events=capture_mode == "cdp",
+                    user_data_dir=profile_dir(account) if account else None)
+    driver.maximize_window()
+    return driver
+
+
+def session_file_path(account:str)->str:
+    return os.path.join("accounts", account, "session.json")
+
+
+def session_is_fresh(account:str, ttl:float=SESSION_TTL_SECONDS)->bool:
+    """Check whether the account's login was confirmed less than ttl seconds ago"""
+    try:
+        with open(session_file_path(account), "r") as f:
+            validated_at = json.load(f)["validated_at"]
+    except (FileNotFoundError, KeyError, ValueError):
+        return False
+    return time.time() - validated_at < ttl
+
+
+def mark_session_valid(account:str):
+    """Remember that the account is logged in right now"""
+    with open(session_file_path(account), "w") as f:
+        json.dump({"validated_at": time.time()}, f)
+
+
+def invalidate_session(account:str):
+    """Forget the cached login so the next start checks it again"""
+    if os.path.exists(session_file_path(account)):
+        os.remove(session_file_path(account))
+
+
 def load_cookies(account:str)->Optional[dict]:
     """Load cookies from file"""
     cookie_file_path = os.path.join("accounts", account, "claude_cookies.pkl")
@@ -57,15 +118,19 @@ def random_sleep(min_seconds=1.0, max_seconds=3.0):
     """Sleep for a random amount of time between min and max seconds"""
     time.sleep(random.uniform(min_seconds, max_seconds))
 
+
+def page_ready(driver:webdriver.Chrome)->bool:
+    return driver.execute_script("return document.readyState") == "complete"
+
+
 def check_limit_reached(driver:webdriver.Chrome)->bool:
     try:
-        driver.find_element(By.XPATH, '//div[contains(text(), "limit reached")]')
-        return True
+        return probe(driver)["limit"]
     except Exception as e:
         return False
 def get_reactivation_time(driver:webdriver.Chrome)->Optional[str]:
     try:
-        reactivation_time_element = driver.find_element(By.XPATH, '//div[contains(text(), "limit reached")]/span')
+        reactivation_time_element = find(driver, "limit_time")
         reactivation_time = reactivation_time_element.text
         print(f"Reactivation time: {reactivation_time}")
         return reactivation_time
@@ -74,18 +139,35 @@ def get_reactivation_time(driver:webdriver.Chrome)->Optional[str]:
         logging.error(f"Error getting reactivation time: {traceback.format_exc()}")
         return None
 
-def handle_login(driver:webdriver.Chrome, account:str):
-    """Handle the login process for Claude.ai"""
+def handle_login(driver:webdriver.Chrome, account:str, persistent_profile:bool=False, session_ttl:float=SESSION_TTL_SECONDS, interactive:bool=True):
+    """Handle the login process for Claude.ai
+
+    With a persistent profile the browser keeps its own cookies, so a login confirmed
+    less than session_ttl seconds ago is trusted without loading any page, and an older
+    one is checked with a single page load before falling back to the cookie file.
+    When not interactive, LoginRequiredError is raised instead of asking for a manual login.
+    """
+    if persistent_profile:
+        if session_is_fresh(account, session_ttl):
+            print("Using cached session")
+            return
+        driver.get("https://claude.ai/projects")
+        WebDriverWait(driver, 20).until(page_ready)
+        if "login" not in driver.current_url:
+            print("Browser profile is still logged in")
+            mark_session_valid(account)
+            return
+
     # Navigate to Claude.ai
     driver.get("about:blank")  # Start with blank page
-    random_sleep(0.5, 1.5)
+    pacing.pause(0.5, 1.5)
     
    
     cookies = load_cookies(account)  # Try to load cookies if they exist
     if cookies:
         print("Cookies found, attempting to log in...")
         driver.get("https://claude.ai")
-        random_sleep(1, 2)
+        pacing.wait("page_ready", lambda: page_ready(driver), 20)
     
         # Add cookies
         print("Adding cookies...")
@@ -93,27 +175,32 @@ def handle_login(driver:webdriver.Chrome, account:str):
             driver.add_cookie({"name": name, "value": value, "domain": ".claude.ai"})
         
         # Navigate to chats page
-        random_sleep(0.5, 1)
+        pacing.pause(0.5, 1)
         driver.get("https://claude.ai/projects")
-        random_sleep(4, 5)
+        # Wait for a redirect to the login page instead of a fixed 4-5 seconds
+        pacing.settle("login_redirect", lambda: driver.current_url)
         
         # Check if we need to log in again
         current_url = driver.current_url
         # print(f"Current URL: {current_url}")
         
         if "login" in current_url:
+            if not interactive:
+                raise LoginRequiredError(f"Cookies for {account} expired or invalid, run interactively once to log in")
             print("Cookies expired or invalid, please log in manually")
             driver.get("https://claude.ai")
             input("Press Enter after you've logged in...")
             save_cookies(driver, account)
     else:
+        if not interactive:
+            raise LoginRequiredError(f"No cookies found for {account}, run interactively once to log in")
         print("No cookies found, please log in manually")
         # First time login
         driver.get("https://claude.ai")
         
         # Check for Cloudflare challenge
         try:
-            if driver.find_element("iframe[src*='cloudflare']","css selector"):
+            if exists(driver, "cloudflare_challenge"):
                 print("⚠️ Cloudflare challenge detected! Please solve it manually.")
                 input("Press Enter after solving the Cloudflare challenge...")
         except:
@@ -121,6 +208,7 @@ def handle_login(driver:webdriver.Chrome, account:str):
         
         input("Please log in manually and press Enter when done...")
         save_cookies(driver, account)
+    mark_session_valid(account)
 
 
 def random_scroll(driver):
@@ -128,25 +216,180 @@ def random_scroll(driver):
     for _ in range(random.randint(1, 3)):
         scroll_amount = random.randint(100, 300)
         driver.execute_script(f"window.scrollBy(0, {scroll_amount});")
-        random_sleep(0.3, 0.7)
+        pacing.pause(0.3, 0.7)
+
+
+# Opens every artifact panel in turn and converts its contents to markdown, all in one
+# injected call. Resolves with [{index, title, heading, content}] in artifact order.
+# If onlyIndices is given, only those artifacts (1-based) are opened.
+BATCH_EXTRACT_SCRIPT = FIND_JS + """
+const selectors = arguments[0], panelTimeoutMs = arguments[1], onlyIndices = arguments[2];
+const resolve = arguments[arguments.length - 1];
+
+function toMarkdown(node) {
+    if (node.nodeType === Node.TEXT_NODE) return node.textContent;
+    if (node.nodeType !== Node.ELEMENT_NODE) return "";
+    const inner = () => Array.from(node.childNodes).map(toMarkdown).join("");
+    const tag = node.tagName.toLowerCase();
+    if (/^h[1-6]$/.test(tag)) return "#".repeat(Number(tag[1])) + " " + inner().trim() + "\\n\\n";
+    switch (tag) {
+        case "p": return inner().trim() + "\\n\\n";
+        case "br": return "\\n";
+        case "hr": return "---\\n\\n";
+        case "strong": case "b": return "**" + inner() + "**";
+        case "em": case "i": return "*" + inner() + "*";
+        case "code": return node.parentElement && node.parentElement.tagName === "PRE" ? inner() : "`" + inner() + "`";
+        case "pre": return "```\\n" + node.innerText.replace(/\\n$/, "") + "\\n```\\n\\n";
+        case "blockquote": return inner().trim().split("\\n").map((line) => "> " + line).join("\\n") + "\\n\\n";
+        case "ul": case "ol": {
+            const items = Array.from(node.children).filter((child) => child.tagName === "LI");
+            return items.map((item, i) => (tag === "ol" ? (i + 1) + ". " : "- ")
+                + toMarkdown(item).trim().replace(/\\n/g, "\\n   ")).join("\\n") + "\\n\\n";
+        }
+        case "li": return inner();
+        default: return inner();
+    }
+}
+
+const panelText = () => {
+    const panel = findOne(selectors.artifact_panel);
+    return panel ? panel.innerText : null;
+};
+
+async function waitForPanel(previousText) {
+    const start = performance.now();
+    let lastText = null;
+    while (performance.now() - start < panelTimeoutMs) {
+        const text = panelText();
+        // Wait for the panel to show a new artifact and stop changing
+        if (text && text !== previousText && text === lastText) return true;
+        lastText = text;
+        await new Promise((r) => setTimeout(r, 100));
+    }
+    // A panel still showing the previous artifact means the click didn't switch it
+    const text = panelText();
+    return text !== null && text !== previousText;
+}
+
+(async () => {
+    const buttons = findAll(selectors.artifact_button);
+    const results = [];
+    let previousText = null;
+    for (let i = 0; i < buttons.length; i++) {
+        if (onlyIndices && !onlyIndices.includes(i + 1)) continue;
+        const button = buttons[i];
+        const titleElement = findOne(selectors.artifact_title, button);
+        button.scrollIntoView({block: "center"});
+        button.click();
+        const opened = await waitForPanel(previousText);
+        const panel = findOne(selectors.artifact_panel);
+        const heading = findOne(selectors.artifact_heading);
+        previousText = panelText();
+        results.push({
+            index: i + 1,
+            title: titleElement ? titleElement.innerText : "",
+            heading: heading ? heading.innerText : "",
+            content: opened && panel ? toMarkdown(panel).replace(/\\n{3,}/g, "\\n\\n").trim() + "\\n" : "",
+        });
+    }
+    return results;
+})().then(resolve, (error) => resolve({error: String(error)}));
+"""
+
+
+def extract_artifacts_batch(driver:webdriver.Chrome, panel_timeout:float=10, only_indices:Optional[list]=None)->list:
+    """Open every artifact panel (or only the given 1-based indices) and read its markdown, title and ordinal in a single injected call"""
+    wait_for_all(driver, "artifact_button")
+    driver.set_script_timeout(300)
+    selectors = js_selectors("artifact_button", "artifact_title", "artifact_panel", "artifact_heading")
+    results = driver.execute_async_script(BATCH_EXTRACT_SCRIPT, selectors, panel_timeout * 1000, only_indices)
+    if isinstance(results, dict):
+        raise Exception(f"Batch artifact extraction failed: {results.get('error')}")
+    for artifact in results:
+        # Same chapter name rules as the per-artifact path
+        if "chapter " not in artifact["title"].lower()[:15]:
+            artifact["title"] = artifact["heading"] if "chapter " in artifact["heading"].lower()[:15] else f"Chapter {artifact['index']}"
+    return results
 
 
-def download_artifacts(driver:webdriver.Chrome, video_number:str, account:str):
-    artifact_buttons = WebDriverWait(driver, 10).until(
-        EC.presence_of_all_elements_located((By.XPATH, '//div[contains(@class, "artifact-block-cell ")]/parent::button[@aria-label="Preview contents"]'))
-    )
-    video_name = ""
+def artifact_panel_text(driver:webdriver.Chrome)->str:
+    """Get the text of the open artifact panel, or "" if none is open"""
+    panels = find_all(driver, "artifact_panel")
+    return panels[0].text if panels else ""
+
+
+def get_video_name(driver:webdriver.Chrome, video_number:str)->str:
+    """Build the video folder name from the chat title"""
+    try:
+        video_name_element = find(driver, "chat_title")
+        video_name = video_name_element.text
+        video_name = clean_file_name(video_name)
+        video_name = video_name + f"_{video_number}"
+    except Exception as e:
+        print("Error finding video name element:", e)
+        video_name = f"Video_{video_number}"
+
+    print(f"Using {video_name} as video name")
+    return video_name
+
+
+def save_artifacts(driver:webdriver.Chrome, artifacts:list, video_number:str, account:str, store=None)->VideoOutput:
+    """Write artifacts (dicts with "title" and "content") as chapters in artifact order. Returns the saved video"""
+    video = VideoOutput(store or FileStore(), account, get_video_name(driver, video_number))
+    with span("file_write", chapters=len(artifacts)):
+        for i, artifact in enumerate(artifacts, 1):
+            video.write_chapter(i, artifact["title"], artifact["content"])
+            print(f"Artifact for chapter '{artifact['title'] or i}' saved as Chapter-{i}")
+    logging.info(f"Saved {len(artifacts)} artifacts for video {video_number} to {video.location}")
+    return video
+
+
+def download_artifacts(driver:webdriver.Chrome, video_number:str, account:str, capture=None, batch:bool=False, store=None)->VideoOutput:
+    """Save all artifacts of the current conversation to the store (Chapter-N.txt files by default) and return the saved video.
+
+    If a CompletionCapture is given the artifacts are rebuilt from the captured network
+    stream. Otherwise (or if the capture doesn't have every artifact of the page) they are read from the page, either
+    all at once with the batch extractor or one by one with the copy button.
+    """
+    if capture is not None:
+        try:
+            artifacts = capture.artifacts()
+        except Exception as e:
+            print("Error reading captured completion streams:", e)
+            logging.error(f"Error reading captured completion streams: {traceback.format_exc()}")
+            artifacts = []
+        page_count = count_artifacts(driver)
+        if artifacts and len(artifacts) == page_count:
+            return save_artifacts(driver, artifacts, video_number, account, store)
+        if artifacts:
+            # Chapters are numbered by their order in the capture, so a missed response body would shift every later chapter
+            print(f"Captured {len(artifacts)} artifacts but the page has {page_count}, reading them from the page instead")
+        else:
+            print("No artifacts captured from the network stream, reading them from the page instead")
+        batch = True
+
+    if batch:
+        try:
+            artifacts = extract_artifacts_batch(driver)
+            if artifacts and all(artifact["content"].strip() for artifact in artifacts):
+                return save_artifacts(driver, artifacts, video_number, account, store)
+            print("Batch extraction returned empty artifacts, copying them one by one instead")
+        except Exception as e:
+            print("Error extracting artifacts in batch:", e)
+            logging.error(f"Error extracting artifacts in batch: {traceback.format_exc()}")
+
+    import pyperclip  # Only this copy button fallback uses the clipboard
+    artifact_buttons = wait_for_all(driver, "artifact_button")
+    video = None
     for i, artifact_button in enumerate(artifact_buttons):
         try:
-            chapter_name = artifact_button.find_element(By.XPATH, './/child::div[contains(@class, "leading-tight")]').text
+            chapter_name = find(artifact_button, "artifact_title").text
             print(f"Downloading artifact for chapter: {chapter_name}")
             if "chapter " not in chapter_name.lower()[:15]:
                 raise Exception("Chapter name not found")
         except Exception as e:
             try:
-                chapter_title = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, '//div[@id="markdown-artifact"]//h1'))
-                ).text
+                chapter_title = wait_for(driver, "artifact_heading").text
                 if "chapter " not in chapter_title.lower()[:15]:
                     raise Exception("Chapter name not found")
                 chapter_name = chapter_title
@@ -155,24 +398,24 @@ def download_artifacts(driver:webdriver.Chrome, video_number:str, account:str):
                 chapter_name = f"Chapter {i+1}"
                 print(f"Using chapter name:", chapter_name)
 
+        previous_panel_text = artifact_panel_text(driver)
         ActionChains(driver).scroll_to_element(artifact_button).perform()
         js_click_element(driver, artifact_button)
-        random_sleep(0.5, 1.5)
+        pacing.wait("panel_open", lambda: artifact_panel_text(driver) not in ("", previous_panel_text))
 
         complete_text = ""
         try:
-            copy_button = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//div[contains(text(),"Copy")]/parent::div/parent::button')))
+            copy_button = wait_for(driver, "copy_button")
             pyperclip.copy("")  # Clear clipboard before copying
             click_element(driver, copy_button)
-            random_sleep(0.5, 1.5)
-            random_sleep(0.5, 1.5)
+            pacing.wait("clipboard", lambda: pyperclip.paste() != "", 5)
             # Get the copied text from clipboard
             complete_text = pyperclip.paste()
             logging.info(f"Used copy button to get complete text for chapter: {chapter_name}")
         except TimeoutException:
             try:
                 complete_text = ""
-                artifact_section_paragraphs = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.XPATH, '//div[@id="markdown-artifact"]//p')))
+                artifact_section_paragraphs = wait_for_all(driver, "artifact_paragraphs")
                 for paragraph in artifact_section_paragraphs:
                     complete_text += paragraph.text + "\n"
                 logging.info(f"Used paragraphs to get complete text for chapter: {chapter_name}")
@@ -181,157 +424,665 @@ def download_artifacts(driver:webdriver.Chrome, video_number:str, account:str):
                 print("Error finding artifact section paragraphs:", e)
                 logging.error(f"Error finding artifact section paragraphs: {traceback.format_exc()}")
 
-        if video_name == "":
-            try:
-                video_name_element = driver.find_element(By.XPATH, '//button[@data-testid="chat-menu-trigger"]/div/div')
-                video_name = video_name_element.text
-                video_name = clean_file_name(video_name)
-                video_name = video_name + f"_{video_number}"
-            except Exception as e:
-                print("Error finding video name element:", e)
-                video_name = f"Video_{video_number}"
-            
-            print(f"Using {video_name} as video name")
-        
-        output_dir = os.path.join("outputFiles", account, video_name)
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        with open(os.path.join(output_dir, f"{clean_file_name(chapter_name)}.txt"), "w", encoding="utf-8") as f:
-            f.write(complete_text)
-        print(f"Artifact for chapter '{chapter_name}' downloaded successfully.")
-    
-    # After all artifacts are downloaded, rename them based on modification time
-    output_dir = os.path.join("outputFiles", account, video_name)
-    files = [os.path.join(output_dir, f) for f in os.listdir(output_dir) if f.endswith('.txt')]
-    
-    # Sort files by modification time
-    files.sort(key=os.path.getmtime)
-    
-    for i, file_path in enumerate(files, 1):
-        new_name = os.path.join(output_dir, f"Chapter-{i}.txt")
-        os.rename(file_path, new_name)
-        print(f"Renamed {os.path.basename(file_path)} to Chapter-{i}.txt")
+        if video is None:
+            video = VideoOutput(store or FileStore(), account, get_video_name(driver, video_number))
+
+        # The chapter number comes from the artifact's position, so no renaming is needed afterwards
+        with span("file_write", chapters=1):
+            video.write_chapter(i + 1, chapter_name, complete_text)
+        print(f"Artifact for chapter '{chapter_name}' downloaded successfully as Chapter-{i + 1}.")
+    return video
+
+
+def find_bad_chapters(video:VideoOutput, expected_count:Optional[int]=None)->list:
+    """Get the 1-based numbers of chapters that are missing, empty or look truncated"""
+    lengths = {position: len(content.strip()) for position, content in video.read_chapters().items()}
+    count = max([expected_count or 0] + list(lengths))
+    if not lengths:
+        return list(range(1, count + 1))
+    median = sorted(lengths.values())[len(lengths) // 2]
+    return [i for i in range(1, count + 1)
+            if lengths.get(i, 0) < MIN_CHAPTER_CHARS or lengths[i] < median * MIN_CHAPTER_RATIO]
+
+
+def refetch_chapters(driver:webdriver.Chrome, video:VideoOutput, chapter_numbers:list):
+    """Read only the given artifacts from the page again and rewrite their chapters.
+
+    A short chapter that reads the same again is really that short, so it is kept with a warning.
+    """
+    print(f"Re-extracting chapters {', '.join(map(str, chapter_numbers))}...")
+    saved = video.read_chapters()
+    confirmed = []
+    for artifact in extract_artifacts_batch(driver, only_indices=chapter_numbers):
+        if not artifact["content"].strip():
+            continue
+        if artifact["content"].strip() == saved.get(artifact["index"], "").strip():
+            confirmed.append(artifact["index"])
+        else:
+            video.write_chapter(artifact["index"], artifact["title"], artifact["content"])
+    if confirmed:
+        print(f"Chapters {', '.join(map(str, confirmed))} read the same again, keeping them although they are short")
+        logging.warning(f"Chapters {confirmed} of {video.location} are short but the page has the same text, kept as they are")
+    still_bad = [i for i in find_bad_chapters(video) if i in chapter_numbers and i not in confirmed]
+    if still_bad:
+        raise StepError(f"Chapters still empty or truncated: {still_bad}")
+
+
+def count_artifacts(driver:webdriver.Chrome)->int:
+    """Count the artifacts in the current conversation"""
+    return len(find_all(driver, "artifact_button"))
+
+
+def normalize_prompt_text(text:str)->str:
+    """Collapse whitespace so editor contents can be compared with the prompt"""
+    return " ".join(text.split())
+
+
+def get_editor_text(driver:webdriver.Chrome, editor)->str:
+    """Get the text currently in the prompt editor"""
+    return driver.execute_script("return arguments[0].innerText;", editor) or ""
+
+
+def clear_editor(driver:webdriver.Chrome, editor):
+    """Remove everything from the prompt editor"""
+    driver.execute_script("""
+        const editor = arguments[0];
+        editor.focus();
+        window.getSelection().selectAllChildren(editor);
+        document.execCommand('delete', false, null);
+    """, editor)
+
 
+def insert_prompt(driver:webdriver.Chrome, editor, prompt:str):
+    """Insert the whole prompt in a single call using a paste event (falls back to insertText)"""
+    driver.execute_script("""
+        const editor = arguments[0], text = arguments[1];
+        editor.focus();
+        const selection = window.getSelection();
+        selection.selectAllChildren(editor);
+        selection.collapseToEnd();
+        const data = new DataTransfer();
+        data.setData('text/plain', text);
+        const pasteEvent = new ClipboardEvent('paste', {clipboardData: data, bubbles: true, cancelable: true});
+        editor.dispatchEvent(pasteEvent);
+        if (!pasteEvent.defaultPrevented) {
+            document.execCommand('insertText', false, text);
+        }
+    """, editor, prompt)
 
-def enter_prompt(driver:webdriver.Chrome, prompt:str):
+
+def type_prompt_chunked(driver:webdriver.Chrome, prompt:str, chunk_size:int=200):
+    """Type the prompt in chunks, one send_keys round trip per chunk. Newlines are sent as Shift+Enter"""
+    for line_index, line in enumerate(prompt.split("\n")):
+        actions = ActionChains(driver)
+        if line_index > 0:
+            actions.key_down(Keys.SHIFT).send_keys(Keys.ENTER).key_up(Keys.SHIFT)
+        for start in range(0, len(line), chunk_size):
+            actions.send_keys(line[start:start + chunk_size])
+        actions.perform()
+
+
+def type_prompt_human(driver:webdriver.Chrome, prompt:str):
+    """Type the prompt one character at a time with small random pauses.
+
+    Newlines are sent as Shift+Enter, a plain Enter would send the prompt so far.
+    """
     actions = ActionChains(driver)
+    for char in prompt:
+        if char == "\n":
+            actions.key_down(Keys.SHIFT).send_keys(Keys.ENTER).key_up(Keys.SHIFT)
+        else:
+            actions.send_keys(char)
+        actions.perform()
+        random_sleep(0.02, 0.05)
+
+
+def fill_prompt(driver:webdriver.Chrome, editor, prompt:str, input_mode:str, chunk_size:int=200)->bool:
+    """Fill the editor using the given input mode and check that it matches the prompt"""
+    if input_mode == "insert":
+        insert_prompt(driver, editor, prompt)
+    elif input_mode == "chunked":
+        type_prompt_chunked(driver, prompt, chunk_size)
+    else:
+        type_prompt_human(driver, prompt)
+    return normalize_prompt_text(get_editor_text(driver, editor)) == normalize_prompt_text(prompt)
+
+
+def last_sent_prompt(driver:webdriver.Chrome)->str:
+    """Get the text of the last message we sent in the conversation"""
+    messages = find_all(driver, "user_message")
+    return messages[-1].text if messages else ""
+
+
+def prompt_already_sent(driver:webdriver.Chrome, prompt:str)->bool:
+    return normalize_prompt_text(last_sent_prompt(driver)) == normalize_prompt_text(prompt)
+
+
+def response_in_progress(driver:webdriver.Chrome)->bool:
+    """Check whether Claude is still responding, after waiting for the page to load"""
+    state = wait_for_probe(driver, lambda state: state["input"], 20)
+    if state is None:
+        raise TimeoutException("Input field not found")
+    return state["stop"]
+
+
+# Checks that the last prompt has a finished answer after it: a response that is no longer
+# streaming and has text, or an artifact
+RESPONSE_AFTER_PROMPT_SCRIPT = FIND_JS + """
+const selectors = arguments[0];
+const prompts = findAll(selectors.user_message);
+const lastPrompt = prompts[prompts.length - 1];
+if (!lastPrompt) return false;
+const after = (element) => !!(lastPrompt.compareDocumentPosition(element) & Node.DOCUMENT_POSITION_FOLLOWING);
+const answered = findAll(selectors.assistant_message).filter(after)
+    .some((message) => message.getAttribute("data-is-streaming") !== "true" && message.innerText.trim() !== "");
+return answered || findAll(selectors.artifact_button).some(after);
+"""
+
+
+def response_finished(driver:webdriver.Chrome)->bool:
+    """Check that the last prompt was answered and nothing is streaming any more (eg after a reload)"""
+    if response_in_progress(driver):
+        return False
+    return bool(driver.execute_script(RESPONSE_AFTER_PROMPT_SCRIPT, js_selectors("user_message", "assistant_message", "artifact_button")))
+
+
+def reload_page(driver:webdriver.Chrome):
+    driver.get(driver.current_url)
+
+
+SEND_READY_ATTEMPTS = 3  # Minute long waits for the send button before the step fails
+
+
+def enter_prompt(driver:webdriver.Chrome, prompt:str, input_mode:str="human", chunk_size:int=200, on_limit:str="wait"):
+    """Enter the prompt into the editor and send it.
+
+    input_mode is one of INPUT_MODES. If the editor contents don't match the prompt,
+    the editor is cleared and the next (slower) mode is tried before giving up.
+    If the message limit is reached, on_limit="wait" waits for the reactivation time
+    and on_limit="raise" raises LimitReachedError so the caller can reschedule.
+    """
+    if input_mode not in INPUT_MODES:
+        print(f"Unknown input mode '{input_mode}', using 'human'")
+        input_mode = "human"
     try:
         # Wait for the input field to be present
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.XPATH, '//div[@aria-label="Write your prompt to Claude"]'))
-        ).click()
+        editor = cached(driver, "prompt_input", 20)
+        editor.click()
     except TimeoutException:
         print("Input field not found!")
-        return
-    for char in prompt:
-        actions.send_keys(char)
-        actions.perform()
-        random_sleep(0.02, 0.05)
-    while True:
-        try:
-            WebDriverWait(driver, 60).until(EC.element_to_be_clickable((By.XPATH, '//button[@aria-label="Send message"]')))
+        raise StepError("Input field not found")
+
+    for mode in INPUT_MODES[INPUT_MODES.index(input_mode):]:
+        if fill_prompt(driver, editor, prompt, mode, chunk_size):
+            break
+        print(f"Prompt text mismatch after '{mode}' input, retrying...")
+        logging.warning(f"Editor contents did not match the prompt using input mode '{mode}'")
+        clear_editor(driver, editor)
+    else:
+        print("Could not enter the prompt correctly!")
+        logging.error("Editor contents did not match the prompt in any input mode, prompt not sent")
+        clear_editor(driver, editor)
+        raise StepError("Editor contents did not match the prompt")
+
+    for attempt in range(1, SEND_READY_ATTEMPTS + 1):
+        # One probe per poll checks both the send button and the limit banner
+        state = wait_for_probe(driver, lambda state: state["send_ready"] or state["limit"], 60)
+        if state is None:
+            print(f"Send button not found! ({attempt}/{SEND_READY_ATTEMPTS})")
+            if attempt == SEND_READY_ATTEMPTS:
+                raise StepError("Send button never became ready")
+        elif state["send_ready"]:
+            break
+        else:
+            snapshots.record(driver, "limit")
+            if on_limit == "raise":
+                raise LimitReachedError(get_reactivation_datetime(driver))
+            limit_reached_seq(driver)
             break
-        except TimeoutException:
-            if check_limit_reached(driver):
-                limit_reached_seq(driver)
-                break
-            else:
-                print("Send button not found!")
 
-    actions.send_keys(Keys.RETURN).perform()
-    random_sleep(1, 1.5)
+    install_response_watch(driver)
+    ActionChains(driver).send_keys(Keys.RETURN).perform()
+    # The send button is disabled once the message is on its way
+    pacing.wait("send", lambda: not probe(driver)["send_ready"], 5)
 
 
 def wait_for_input(timeout):
-    """Waits for Enter key press with a timeout while displaying a countdown (Windows version)."""
-    start_time = time.time()
-    while True:
-        remaining_time = timeout - (time.time() - start_time)
-        if remaining_time <= 0:
-            print("\nTime's up!.")
-            return False  # Timeout reached
-        mins, secs = divmod(remaining_time, 60)
-        hours, mins = divmod(mins, 60)
-        sys.stdout.write("\rTime left: {:02d}:{:02d}:{:02d} Press Enter to resume Now... ".format(int(hours), int(mins), int(secs)))
-        sys.stdout.flush()
+    """Wait for timeout seconds with a countdown, or until Enter is pressed (or wakeup.WAKE_FILE/SIGUSR1).
 
-        # Check if a key was pressed
-        if msvcrt.kbhit():
-            key = msvcrt.getch()
-            if key == b'\r':  # Enter key is detected
-                print("\nUser pressed Enter!")
-                return True  # Input received
+    Sleeps without using the CPU and only blocks the calling worker. Returns True if the wait ended early.
+    """
+    return wakeup.wait_until(datetime.datetime.now() + datetime.timedelta(seconds=timeout))
 
-        time.sleep(0.1)  # Reduce CPU usage
 
+REACTIVATION_BUFFER_SECONDS = 10*60  # Wait a little longer than the time Claude shows
+DEFAULT_LIMIT_WAIT_SECONDS = 5*60*60 + 10*60  # Used when the reactivation time can't be read
 
-def sleep_until_time(time_str:str):
-    
-    import datetime
-    import time
-    
-    # Parse the time string
+
+class LimitReachedError(Exception):
+    """Raised instead of waiting when the message limit is reached"""
+
+    def __init__(self, reactivation_at:datetime.datetime):
+        super().__init__(f"Message limit reached, reactivates at {reactivation_at:%Y-%m-%d %H:%M}")
+        self.reactivation_at = reactivation_at
+
+
+def parse_reactivation_time(time_str:Optional[str])->Optional[datetime.datetime]:
+    """Turn a time like '1:30 AM' into the next datetime it occurs, plus the safety buffer"""
+    if not time_str:
+        return None
     try:
         target_time = datetime.datetime.strptime(time_str.strip(), "%I:%M %p").time()
     except ValueError:
         print(f"Error: Could not parse time string '{time_str}'. Expected format like '1:30 AM'")
         logging.error(traceback.format_exc())
-        return
-    
-    # Get current time
+        return None
+
+    # Combine today's date with the target time, or tomorrow's if it has already passed
     now = datetime.datetime.now()
-    
-    # Create target datetime (combines today's date with target time)
     target_datetime = datetime.datetime.combine(now.date(), target_time)
-    
-    # If target time has already passed today, set it for tomorrow
     if target_datetime < now:
         target_datetime += datetime.timedelta(days=1)
-    
+    return target_datetime + datetime.timedelta(seconds=REACTIVATION_BUFFER_SECONDS)
+
+
+def get_reactivation_datetime(driver:webdriver.Chrome)->datetime.datetime:
+    """Get when the account can send messages again, falling back to the default wait"""
+    reactivation_at = parse_reactivation_time(get_reactivation_time(driver))
+    if reactivation_at is None:
+        reactivation_at = datetime.datetime.now() + datetime.timedelta(seconds=DEFAULT_LIMIT_WAIT_SECONDS)
+    return reactivation_at
+
+
+def sleep_until_time(time_str:str):
+    reactivation_at = parse_reactivation_time(time_str)
+    if reactivation_at is None:
+        return
+
     # Calculate seconds until target time
-    seconds_to_wait = (target_datetime - now).total_seconds()
-    seconds_to_wait += 10*60  # Add 10 minutes buffer
-    
+    seconds_to_wait = (reactivation_at - datetime.datetime.now()).total_seconds()
+
     print(f"Waiting until {time_str} ({seconds_to_wait:.0f} seconds from now)")
-    
-    # Using your existing wait_for_input function which shows a countdown
-    # and allows user to skip by pressing Enter
-    return wait_for_input(seconds_to_wait)
+
+    print(f"Press Enter, create '{wakeup.WAKE_FILE}' or send SIGUSR1 to resume early")
+    return wakeup.wait_until(reactivation_at)
 
 
 def limit_reached_seq(driver:webdriver.Chrome):
     reactivation_time = get_reactivation_time(driver)
-    if reactivation_time == None:
-        print("Limit reached! waiting for 5 hours 10 mins...")
-        wait_for_input(5*60*60 + 10*60)  # Wait for 5 hours 10 minutes
-    else:
-        sleep_until_time(reactivation_time)
+    with span("limit_wait"):
+        if reactivation_time == None:
+            print("Limit reached! waiting for 5 hours 10 mins...")
+            wait_for_input(DEFAULT_LIMIT_WAIT_SECONDS)  # Wait for 5 hours 10 minutes
+        else:
+            sleep_until_time(reactivation_time)
     driver.get(driver.current_url)
+    install_response_watch(driver)
     ActionChains(driver).send_keys(Keys.RETURN).perform()
 
-def wait_for_response(driver:webdriver.Chrome):
-    current_time = time.time()
+RESPONSE_POLL_SECONDS = 30
+
+# Installs a MutationObserver that records when the page last changed and when the stop
+# button appeared and went away, even while nobody is waiting (eg during a pipelined extraction).
+# Timestamps are performance.now() values relative to watch.start, which is set just before sending.
+INSTALL_RESPONSE_WATCH_SCRIPT = FIND_JS + """
+const stopLocators = arguments[0];
+if (window.__responseWatch) {
+    window.__responseWatch.observer.disconnect();
+}
+const watch = {start: performance.now(), firstToken: null, lastMutation: null, stopSeen: false, stopSeenAt: null,
+               stopGoneAt: null, lastCheck: 0, listener: null, stopLocators: stopLocators};
+watch.observer = new MutationObserver(() => {
+    const now = performance.now();
+    watch.lastMutation = now;
+    if (findOne(stopLocators)) {
+        if (!watch.stopSeen) {
+            watch.stopSeen = true;
+            watch.stopSeenAt = now;
+        }
+        watch.stopGoneAt = null;
+    } else if (watch.stopSeen && watch.stopGoneAt === null) {
+        watch.stopGoneAt = now;
+    }
+    if (watch.listener && now - watch.lastCheck > 100) {
+        watch.lastCheck = now;
+        watch.listener();
+    }
+    if (watch.stopSeen && watch.firstToken === null && watch.stopSeenAt < now) {
+        watch.firstToken = now;
+    }
+});
+watch.observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+window.__responseWatch = watch;
+"""
+
+# Resolves as soon as the stop button disappears ("done"), the page stops changing while
+# the stop button is still shown ("stalled"), the response never starts ("not_started"),
+# or maxWaitMs passes ("pending") so that the caller can check its own timeout.
+WAIT_RESPONSE_SCRIPT = FIND_JS + """
+const maxWaitMs = arguments[0], stallMs = arguments[1], startMs = arguments[2];
+const resolve = arguments[arguments.length - 1];
+const watch = window.__responseWatch;
+if (!watch) {
+    resolve(null);
+    return;
+}
+const stopPresent = () => !!findOne(watch.stopLocators);
+const callStart = performance.now();
+let finished = false;
+let timer = null;
+function report(status) {
+    if (finished) return;
+    finished = true;
+    watch.listener = null;
+    clearInterval(timer);
+    const since = (t) => t === null ? null : t - watch.start;
+    // A response that finished before this call ended when the stop button went away
+    const end = status === "done" && watch.stopGoneAt !== null ? watch.stopGoneAt : performance.now();
+    resolve({status: status, elapsed: end - watch.start, stop_seen: watch.stopSeen,
+             first_token: since(watch.firstToken), last_mutation: since(watch.lastMutation)});
+}
+function check() {
+    const now = performance.now();
+    const present = stopPresent();
+    if (present && !watch.stopSeen) {
+        watch.stopSeen = true;
+        watch.stopSeenAt = now;
+    }
+    if (watch.stopSeen && !present) return report("done");
+    if (watch.stopSeen) {
+        if (now - Math.max(watch.lastMutation || 0, watch.stopSeenAt) > stallMs) return report("stalled");
+    } else if (now - watch.start > startMs) {
+        return report("not_started");
+    }
+    if (now - callStart > maxWaitMs) return report("pending");
+}
+watch.listener = check;
+timer = setInterval(check, 250);
+check();
+"""
+
+
+def install_response_watch(driver:webdriver.Chrome):
+    """Start watching the page for response activity. Call right before sending a prompt"""
+    driver.execute_script(INSTALL_RESPONSE_WATCH_SCRIPT, js_selectors("stop_button")["stop_button"])
+
+
+def wait_for_response(driver:webdriver.Chrome, timeout:float=900, stall_timeout:float=60, start_timeout:float=100)->dict:
+    """Wait until Claude finishes responding.
+
+    Returns a dict with "status" ("done", "stalled", "timeout" or "not_started"),
+    "time_to_first_token" and "time_to_completion" in seconds since the prompt was sent.
+    A stalled response shows the stop button but the page hasn't changed for
+    stall_timeout seconds; a slow one is still changing when timeout is reached.
+    """
+    driver.set_script_timeout(RESPONSE_POLL_SECONDS + 30)
+    if not driver.execute_script("return !!window.__responseWatch;"):
+        install_response_watch(driver)
+
+    print("Waiting for response to start...")
+    response_started = False
     while True:
-        if time.time() - current_time > 900:
-            print("Waiting for response timed out after 15 minutes.")
-            return
-        try:
-            print("Waiting for response to start...")
-            response = WebDriverWait(driver, 100).until(EC.presence_of_element_located((By.XPATH, '//button[@aria-label="Stop response"]')))
+        state = driver.execute_async_script(WAIT_RESPONSE_SCRIPT, RESPONSE_POLL_SECONDS * 1000,
+                                            stall_timeout * 1000, start_timeout * 1000)
+        if state is None:
+            # The page was reloaded and the watch was lost
+            install_response_watch(driver)
+            continue
+        if state["stop_seen"] and not response_started:
+            response_started = True
             print("Response started.")
+        if state["status"] != "pending":
+            break
+        if state["elapsed"] / 1000 > timeout:
+            state["status"] = "timeout"
             break
-        except:
-            pass
-        random_sleep(0.5, 1.5)
 
-    while True:
+    result = {
+        "status": state["status"],
+        "time_to_first_token": state["first_token"] / 1000 if state["first_token"] is not None else None,
+        "time_to_completion": state["elapsed"] / 1000,
+    }
+    if result["status"] == "done":
+        first_token = result["time_to_first_token"]
+        print(f"Response finished in {result['time_to_completion']:.1f}s"
+              + (f" (first token after {first_token:.1f}s)." if first_token is not None else "."))
+    elif result["status"] == "stalled":
+        print(f"Response stalled: no output for {stall_timeout:.0f} seconds.")
+        logging.warning(f"Response stalled after {result['time_to_completion']:.1f}s")
+    elif result["status"] == "timeout":
+        print(f"Waiting for response timed out after {timeout / 60:.0f} minutes.")
+        logging.warning(f"Response still streaming after {timeout}s")
+    else:
+        print("Response did not start.")
+        logging.warning(f"Response did not start within {start_timeout}s")
+    return result
+
+
+class ChapterCheckpointer:
+    """Saves every new artifact to the store as soon as its response finishes ("incremental" config option).
+
+    If the browser dies halfway through a video the chapters written so far are kept, and
+    the final download only has to confirm them and re-extract what is missing.
+    """
+
+    def __init__(self, driver:webdriver.Chrome, config:dict, output_dir:str, video_number):
+        self.driver = driver
+        self.store = get_store(config)
+        self.output_dir = output_dir
+        self.video_number = video_number
+        self.video = None
+        self.saved = {}  # position -> content hash
+
+    def open(self, resumed:bool):
+        self.video = VideoOutput(self.store, self.output_dir, get_video_name(self.driver, str(self.video_number)))
+        if resumed:
+            # Chapters from before the interruption belong to the same conversation
+            self.saved = {position: content_hash(content) for position, content in self.video.read_chapters().items()}
+
+    def checkpoint(self, capture=None, resumed:bool=False):
+        """Save the artifacts that appeared (or changed, when captured) since the last checkpoint.
+
+        Errors are only logged, the final download re-extracts anything that was missed.
+        """
         try:
-            response = WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located((By.XPATH, '//button[@aria-label="Stop response"]'))
-            )
-        except TimeoutException:
-            print("Response finished.")
-            break
-            
-        random_sleep(0.5, 1.5)
+            count = count_artifacts(self.driver)
+            captured = capture.artifacts() if capture is not None else None
+            if captured is not None and len(captured) != count:
+                # Captured artifacts are numbered by their order, so a missed response body would shift the later chapters
+                print(f"Captured {len(captured)} artifacts but the page has {count}, reading the new ones from the page")
+                captured = None
+            if captured is not None:
+                artifacts = [{**artifact, "index": i} for i, artifact in enumerate(captured, 1)]
+            else:
+                if self.video is None and count:
+                    self.open(resumed)
+                new_indices = [i for i in range(1, count + 1) if i not in self.saved]
+                artifacts = extract_artifacts_batch(self.driver, only_indices=new_indices) if new_indices else []
+            artifacts = [artifact for artifact in artifacts
+                         if artifact["content"].strip() and self.saved.get(artifact["index"]) != content_hash(artifact["content"])]
+            if not artifacts:
+                return
+            if self.video is None:
+                self.open(resumed)
+            with span("file_write", chapters=len(artifacts)):
+                for artifact in artifacts:
+                    self.video.write_chapter(artifact["index"], artifact["title"], artifact["content"])
+                    self.saved[artifact["index"]] = content_hash(artifact["content"])
+            print(f"Checkpointed chapters {', '.join(str(artifact['index']) for artifact in artifacts)} to {self.video.location}")
+        except Exception as e:
+            print("Error checkpointing chapters:", e)
+            logging.error(f"Error checkpointing chapters of video {self.video_number}: {traceback.format_exc()}")
+
+
+def retry_policy_for(config:dict)->dict:
+    """Retry policy for the steps of a video. Limits and expired sessions are handled by the caller"""
+    return {**get_retry_policy(config), "give_up_on": (LimitReachedError, SessionExpiredError)}
+
+
+def generate_video(driver:webdriver.Chrome, config:dict, video_number, capture=None, on_limit:str="wait", progress=None, while_waiting=None, checkpointer=None)->bool:
+    """Run the initial prompt and all generation prompts for one video.
+
+    Each step is retried according to the config's retry policy. If a journal
+    VideoProgress is given, every finished step is recorded and a video that was
+    interrupted earlier continues in its conversation at the first unfinished prompt.
+    while_waiting is called once, right after the first prompt is sent, so other work
+    can overlap with Claude's response. A ChapterCheckpointer saves new artifacts after
+    every response. Returns True if the video was resumed.
+    """
+    input_mode = config.get("input_mode", "human")
+    input_chunk_size = config.get("input_chunk_size", 200)
+    stall_timeout = config.get("stall_timeout", 60)
+    retry_policy = retry_policy_for(config)
+
+    def send_prompt(name, prompt):
+        with span("prompt_typing", characters=len(prompt)):
+            retry_step(name, lambda: enter_prompt(driver, prompt, input_mode, input_chunk_size, on_limit),
+                       before_retry=lambda: reload_page(driver),
+                       already_done=lambda: prompt_already_sent(driver, prompt), **retry_policy)
+
+    def wait_for_finished_response(name, prompt):
+        nonlocal while_waiting
+        if while_waiting is not None:
+            callback, while_waiting = while_waiting, None
+            callback()
+        attempt = 0
+
+        def wait():
+            nonlocal attempt
+            attempt += 1
+            if attempt > 1 and not response_in_progress(driver):
+                # The reloaded page has no answer to the prompt and nothing is streaming, so ask again
+                print(f"{name} was not answered, sending it again")
+                with span("prompt_typing", characters=len(prompt)):
+                    enter_prompt(driver, prompt, input_mode, input_chunk_size, on_limit)
+            result = wait_for_response(driver, stall_timeout=stall_timeout)
+            finished_at = time.time()
+            sent_at = finished_at - result["time_to_completion"]
+            first_token_at = sent_at + (result["time_to_first_token"] or 0)
+            record_span("first_token", sent_at, first_token_at)
+            record_span("generation", first_token_at, finished_at, status=result["status"])
+            if result["status"] != "done":
+                raise StepError(f"Response {result['status']}")
+        # A reloaded page with this prompt last and an answer after it means the response finished in the meantime.
+        # One that never started (or whose prompt never arrived) has none, so the retry sends the prompt again
+        retry_step(f"{name} response", wait, before_retry=lambda: reload_page(driver),
+                   already_done=lambda: prompt_already_sent(driver, prompt) and response_finished(driver), **retry_policy)
+
+    print(f"Processing video number: {video_number}")
+    resuming = bool(progress is not None and progress.done("initial") and progress.conversation_url and not progress.done("download"))
+    if progress is not None and not resuming and (progress.done("initial") or progress.done("download")):
+        progress.restart()
+
+    if resuming:
+        print(f"Resuming video {video_number} in {progress.conversation_url}")
+        with span("page_load"):
+            driver.get(progress.conversation_url)
+    else:
+        with span("page_load"):
+            driver.get(config["project_link"])
+        if "login" in driver.current_url:
+            raise SessionExpiredError("Not logged in, the session has expired")
+        if capture is not None:
+            capture.reset()
+
+        text_to_be_replaced = config["text_to_be_replaced_by_video_number"]
+        initial_prompt = config["initial_prompt"]
+
+        if text_to_be_replaced in initial_prompt:
+            initial_prompt = initial_prompt.replace(text_to_be_replaced, str(video_number))
+        else:
+            print(f"Warning: '{text_to_be_replaced}' not found in the initial prompt.")
+
+        print(f"Entering Initial Prompt: {initial_prompt}")
+        with trace_context(prompt=0):
+            send_prompt("Initial prompt", initial_prompt)
+
+            wait_for_finished_response("Initial prompt", initial_prompt)
+        if capture is not None:
+            capture.poll()
+        if checkpointer is not None:
+            checkpointer.checkpoint(capture)
+        if progress is not None:
+            progress.record("initial", conversation_url=driver.current_url)
+
+    generation_prompts = config["generation_prompts"]
+    check_resumed_prompt = resuming
+    for i, prompt in enumerate(generation_prompts):
+        if progress is not None and progress.done(f"prompt-{i+1}"):
+            continue
+
+        with trace_context(prompt=i+1):
+            sent = answered = False
+            if check_resumed_prompt:
+                # The run may have stopped after sending this prompt, while or after it was answered
+                check_resumed_prompt = False
+                sent = response_in_progress(driver) or prompt_already_sent(driver, prompt)
+                answered = sent and response_finished(driver)
+            if answered:
+                print(f"Prompt {i+1} was already answered")
+            else:
+                if sent:
+                    # Waiting sends the prompt again if no response starts
+                    print(f"Prompt {i+1} was already sent, waiting for its response")
+                else:
+                    print(f"Entering Prompt {i+1}: {prompt}")
+                    send_prompt(f"Prompt {i+1}", prompt)
+
+                wait_for_finished_response(f"Prompt {i+1}", prompt)
+        if capture is not None:
+            capture.poll()
+        if checkpointer is not None:
+            # Responses from before a resume were not captured, so read those from the page
+            checkpointer.checkpoint(None if resuming else capture, resuming)
+        if progress is not None:
+            progress.record(f"prompt-{i+1}")
+
+    if while_waiting is not None:
+        # Every prompt was already done, so there was no response to overlap with
+        while_waiting()
+    return resuming
+
+
+def extract_video(driver:webdriver.Chrome, config:dict, output_dir:str, video_number, capture=None, progress=None, video:Optional[VideoOutput]=None)->VideoOutput:
+    """Download the artifacts of the conversation open in the driver, re-extract bad chapters and journal the result.
+
+    Without a capture the artifacts are read from the page. Chapters go to the store selected
+    by the config's "storage" option. If the video's chapters were already checkpointed
+    during generation they are only confirmed. Returns the saved video.
+    """
+    retry_policy = retry_policy_for(config)
+    batch = capture is None and config.get("capture_mode", "dom") != "dom"
+    store = get_store(config)
+    if video is None:
+        with span("artifact_extraction"):
+            video = retry_step("Download", lambda: download_artifacts(driver, str(video_number), output_dir, capture, batch=batch, store=store), **retry_policy)
+
+    # Re-extract only the chapters that came out empty or truncated. Every generation prompt makes one
+    # artifact, so a response that was cut off before its artifact shows up as a missing chapter
+    artifact_count = len(config["generation_prompts"])
+    bad_chapters = find_bad_chapters(video, artifact_count)
+    if bad_chapters:
+        print(f"Chapters {', '.join(map(str, bad_chapters))} look empty or truncated")
+        with span("artifact_extraction", refetch=True):
+            retry_step("Re-extracting chapters", lambda: refetch_chapters(driver, video, find_bad_chapters(video, artifact_count)), **retry_policy)
+
+    if progress is not None:
+        progress.record_download(video)
+    snapshots.record(driver, "conversation", video_number, video)
+    return video
+
+
+def process_video(driver:webdriver.Chrome, config:dict, output_dir:str, video_number, capture=None, on_limit:str="wait", progress=None,
+                  before_extraction=None)->VideoOutput:
+    """Run the initial prompt and all generation prompts for one video, then download its artifacts. Returns the saved video.
 
+    before_extraction() is called in between and may raise to keep the video from being saved.
+    """
+    checkpointer = ChapterCheckpointer(driver, config, output_dir, video_number) if config.get("incremental", False) else None
+    resumed = generate_video(driver, config, video_number, capture, on_limit, progress, checkpointer=checkpointer)
+    if before_extraction is not None:
+        before_extraction()
+    # Responses from before a resume were not captured, so read the artifacts from the page instead
+    return extract_video(driver, config, output_dir, video_number, None if resumed else capture, progress,
+                         checkpointer.video if checkpointer is not None else None)
@@ -0,0 +1,144 @@
+import json
+import re
+import logging
+import traceback
+from selenium import webdriver
+
+
+COMPLETION_URL_PATTERN = re.compile(r"/chat_conversations/[^/]+/(retry_)?completion")
+ANT_ARTIFACT_PATTERN = re.compile(r'<antArtifact\b([^>]*)>(.*?)</antArtifact>', re.DOTALL)
+ATTRIBUTE_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+
+
+def parse_sse(body:str)->list:
+    """Parse a server-sent events body into a list of (event, data) tuples"""
+    events = []
+    event_name = None
+    data_lines = []
+    for line in body.splitlines() + [""]:
+        if line.startswith("event:"):
+            event_name = line[6:].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].strip())
+        elif line == "" and data_lines:
+            data = "\n".join(data_lines)
+            try:
+                data = json.loads(data)
+            except json.JSONDecodeError:
+                pass
+            events.append((event_name, data))
+            event_name = None
+            data_lines = []
+    return events
+
+
+def apply_artifact_command(artifacts:dict, command:dict):
+    """Apply an artifacts tool call (create/update/rewrite) to the artifacts dict"""
+    artifact_id = command.get("id") or command.get("identifier")
+    if not artifact_id:
+        return
+    action = command.get("command", "create")
+    if action == "update" and artifact_id in artifacts:
+        artifact = artifacts[artifact_id]
+        artifact["content"] = artifact["content"].replace(command.get("old_str", ""), command.get("new_str", ""), 1)
+    elif action in ("create", "rewrite") or artifact_id not in artifacts:
+        artifact = artifacts.setdefault(artifact_id, {"id": artifact_id, "title": "", "content": ""})
+        artifact["content"] = command.get("content", artifact["content"])
+    if command.get("title"):
+        artifacts[artifact_id]["title"] = command["title"]
+
+
+def rebuild_artifacts(bodies:list)->list:
+    """Rebuild artifacts from completion stream bodies, in the order they were created.
+
+    Handles both the artifacts tool_use blocks and the older <antArtifact> tags in text.
+    """
+    artifacts = {}
+    for body in bodies:
+        blocks = {}
+        text = ""
+        for event, data in parse_sse(body):
+            if not isinstance(data, dict):
+                continue
+            event = event or data.get("type")
+            if event == "content_block_start":
+                blocks[data.get("index")] = {"block": data.get("content_block", {}), "partial_json": ""}
+            elif event == "content_block_delta":
+                delta = data.get("delta", {})
+                block = blocks.setdefault(data.get("index"), {"block": {}, "partial_json": ""})
+                if delta.get("type") == "input_json_delta":
+                    block["partial_json"] += delta.get("partial_json", "")
+                elif delta.get("type") == "text_delta":
+                    text += delta.get("text", "")
+            elif event == "content_block_stop":
+                block = blocks.pop(data.get("index"), None)
+                if block and block["block"].get("type") == "tool_use" and block["block"].get("name") == "artifacts":
+                    try:
+                        apply_artifact_command(artifacts, json.loads(block["partial_json"] or "{}"))
+                    except json.JSONDecodeError:
+                        logging.error(f"Could not parse artifact tool input: {traceback.format_exc()}")
+            elif event == "completion":
+                text += data.get("completion", "")
+
+        for attributes, content in ANT_ARTIFACT_PATTERN.findall(text):
+            command = dict(ATTRIBUTE_PATTERN.findall(attributes))
+            command["content"] = content.strip("\n")
+            apply_artifact_command(artifacts, command)
+    return list(artifacts.values())
+
+
+class CompletionCapture:
+    """Collects completion event streams from the page over the Chrome DevTools Protocol.
+
+    The driver must be launched with log_cdp_events=True so that network events end up
+    in the performance log. Call poll() after every response, before leaving the page.
+    """
+
+    def __init__(self, driver:webdriver.Chrome):
+        self.driver = driver
+        self.pending_requests = set()
+        self.bodies = []
+        driver.execute_cdp_cmd("Network.enable", {"maxTotalBufferSize": 100_000_000, "maxResourceBufferSize": 50_000_000})
+        driver.get_log("performance")  # Drop events from before the capture started
+
+    def poll(self):
+        """Read new network events and fetch the bodies of finished completion streams"""
+        for entry in self.driver.get_log("performance"):
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, json.JSONDecodeError):
+                continue
+            method = message.get("method")
+            params = message.get("params", {})
+            if method == "Network.responseReceived":
+                if COMPLETION_URL_PATTERN.search(params.get("response", {}).get("url", "")):
+                    self.pending_requests.add(params["requestId"])
+            elif method == "Network.loadingFinished" and params.get("requestId") in self.pending_requests:
+                self.pending_requests.discard(params["requestId"])
+                try:
+                    body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+                    self.bodies.append(body.get("body", ""))
+                except Exception as e:
+                    print("Error getting completion stream body:", e)
+                    logging.error(f"Error getting completion stream body: {traceback.format_exc()}")
+
+    def reset(self):
+        """Forget everything captured so far (call when starting a new conversation)"""
+        self.poll()
+        self.pending_requests.clear()
+        self.bodies = []
+
+    def artifacts(self)->list:
+        """Get the artifacts rebuilt from all captured streams"""
+        self.poll()
+        return rebuild_artifacts(self.bodies)
+
+
+class CapturedArtifacts:
+    """Artifacts taken from a CompletionCapture earlier, so they can be saved after the capture moved on"""
+
+    def __init__(self, artifacts:list):
+        self._artifacts = artifacts
+
+    def artifacts(self)->list:
+        return self._artifacts
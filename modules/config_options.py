@@ -0,0 +1,4 @@
+# Allowed values of the config options, kept apart from the browser code so that
+# configs can be validated without importing selenium
+INPUT_MODES = ("insert", "chunked", "human")
+CAPTURE_MODES = ("dom", "batch", "cdp")
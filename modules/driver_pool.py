@@ -0,0 +1,46 @@
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from modules.automation_parts import launch_driver
+
+
+class DriverPool:
+    """Launches browsers for accounts in the background so they are ready when a batch starts"""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(thread_name_prefix="driver-pool")
+        self.lock = threading.Lock()
+        self.futures = {}
+
+    def prelaunch(self, accounts:list, capture_mode:str="dom", headless:bool=False, persistent_profile:bool=True):
+        """Start launching one browser per account without waiting for them"""
+        with self.lock:
+            for account in accounts:
+                if account not in self.futures:
+                    self.futures[account] = self.executor.submit(
+                        launch_driver, capture_mode, headless, account if persistent_profile else None)
+
+    def get(self, account:str, capture_mode:str="dom", headless:bool=False, persistent_profile:bool=True):
+        """Take the account's pre-launched browser, or launch one now"""
+        with self.lock:
+            future = self.futures.pop(account, None)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception as e:
+                print(f"[{account}] Pre-launched browser failed to start: {e}")
+                logging.error(f"Pre-launched browser for {account} failed: {traceback.format_exc()}")
+        return launch_driver(capture_mode, headless, account if persistent_profile else None)
+
+    def close(self):
+        """Quit every browser that was launched but never taken"""
+        with self.lock:
+            futures = list(self.futures.values())
+            self.futures.clear()
+        for future in futures:
+            try:
+                future.result().quit()
+            except Exception:
+                pass
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import traceback
+from typing import Optional
+
+from modules.storage import VideoOutput, open_video, chapter_file_name, content_hash
+from modules.output_index import OutputIndex, is_intact
+
+
+JOURNAL_PATH = os.path.join("outputFiles", "journal.jsonl")
+
+
+def file_hash(path:str)->str:
+    """Get the sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_chapter_files(output_dir:str)->dict:
+    """Hash every .txt file in a video folder"""
+    return {f: file_hash(os.path.join(output_dir, f)) for f in sorted(os.listdir(output_dir)) if f.endswith(".txt")}
+
+
+class Journal:
+    """Append-only JSONL record of finished steps, keyed by (account, config, video, step).
+
+    Steps are "initial" (with the conversation URL), "prompt-N" for each generation
+    prompt and "download" (with where the chapters were stored and a hash of every chapter).
+    Downloads also go to the output index (outputFiles/index.sqlite next to the journal).
+    """
+
+    def __init__(self, path:str=JOURNAL_PATH, index:Optional[OutputIndex]=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.videos = {}
+        self.downloads = {}  # (config, video) -> {account: download entry}
+        self.index = index if index is not None else OutputIndex(os.path.join(os.path.dirname(path) or ".", "index.sqlite"))
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A crash while writing can leave a partial last line
+                        logging.warning(f"Skipping unreadable journal line: {line!r}")
+
+    def _apply(self, entry:dict):
+        key = (entry["account"], entry["config"], str(entry["video"]))
+        video = self.videos.setdefault(key, {"steps": set(), "conversation_url": None, "download": None})
+        downloads = self.downloads.setdefault((entry["config"], str(entry["video"])), {})
+        if entry["step"] == "restart":
+            video.update(steps=set(), conversation_url=None, download=None)
+            downloads.pop(entry["account"], None)
+            return
+        video["steps"].add(entry["step"])
+        if entry.get("conversation_url"):
+            video["conversation_url"] = entry["conversation_url"]
+        if entry["step"] == "download":
+            video["download"] = entry
+            downloads[entry["account"]] = entry
+
+    def record(self, account:str, config_name:str, video_number, step:str, **details):
+        """Durably append a finished step"""
+        entry = {"time": time.time(), "account": account, "config": config_name, "video": str(video_number), "step": step, **details}
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(entry)
+
+    def completed_output(self, config_name:str, video_number)->Optional[str]:
+        """Get the output location of a finished video if its chapters are still intact in their store.
+
+        Chapter files of indexed videos that kept their size and mtime are not read again;
+        everything else is checked against the recorded hashes.
+        """
+        with self.lock:
+            downloads = list(self.downloads.get((config_name, str(video_number)), {}).values())
+        try:
+            entry = self.index.lookup(config_name, video_number)
+        except sqlite3.Error:
+            logging.warning(f"Could not read the output index: {traceback.format_exc()}")
+            entry = None
+        for download in downloads:
+            output_dir = download.get("output_dir")
+            try:
+                if entry is not None and download.get("files") and entry["files"] == download["files"]:
+                    if is_intact(entry):
+                        return output_dir
+                    continue
+                if download.get("output"):
+                    hashes = open_video(download["output"]).hashes()
+                elif output_dir:
+                    # Written before storage backends existed
+                    hashes = hash_chapter_files(output_dir)
+                else:
+                    continue
+                if download.get("files") and hashes == download["files"]:
+                    return output_dir
+            except Exception:
+                logging.warning(f"Could not verify output of video {video_number}: {traceback.format_exc()}")
+        if not downloads and entry is not None and is_intact(entry):
+            # Finished by another machine sharing outputFiles, or indexed by a rebuild
+            return entry["location"]
+        return None
+
+    def for_video(self, account:str, config_name:str, video_number)->"VideoProgress":
+        return VideoProgress(self, account, config_name, video_number)
+
+
+class VideoProgress:
+    """The journal entries of one video for one account"""
+
+    def __init__(self, journal:Journal, account:str, config_name:str, video_number):
+        self.journal = journal
+        self.account = account
+        self.config_name = config_name
+        self.video_number = video_number
+
+    @property
+    def _video(self)->dict:
+        return self.journal.videos.get((self.account, self.config_name, str(self.video_number)),
+                                       {"steps": set(), "conversation_url": None, "download": None})
+
+    @property
+    def conversation_url(self)->Optional[str]:
+        return self._video["conversation_url"]
+
+    def done(self, step:str)->bool:
+        return step in self._video["steps"]
+
+    def record(self, step:str, **details):
+        try:
+            self.journal.record(self.account, self.config_name, self.video_number, step, **details)
+        except OSError:
+            print(f"Error writing to journal: {traceback.format_exc()}")
+            logging.error(f"Error writing to journal: {traceback.format_exc()}")
+
+    def restart(self):
+        """Forget earlier progress so the video starts again from a new conversation"""
+        self.record("restart")
+
+    def record_download(self, video:VideoOutput):
+        chapters = video.read_chapters()
+        self.record("download", output_dir=video.location, output=video.describe(),
+                    files={chapter_file_name(position): content_hash(content) for position, content in sorted(chapters.items())})
+        try:
+            self.journal.index.record(self.config_name, self.video_number, self.account, video, chapters)
+        except (OSError, sqlite3.Error):
+            print(f"Error updating the output index: {traceback.format_exc()}")
+            logging.error(f"Error updating the output index: {traceback.format_exc()}")
@@ -0,0 +1,170 @@
+import time
+import threading
+from typing import Optional
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, WebDriverException
+
+
+# Every element the automation looks for on claude.ai. Locators are tried in order,
+# CSS first; the first one that matches is remembered and tried first next time.
+# When the UI changes, this table is the only place that needs editing.
+SELECTORS = {
+    "prompt_input": [("css", 'div[aria-label="Write your prompt to Claude"]'),
+                     ("xpath", '//div[@aria-label="Write your prompt to Claude"]')],
+    "send_button": [("css", 'button[aria-label="Send message"]'),
+                    ("xpath", '//button[@aria-label="Send message"]')],
+    "stop_button": [("css", 'button[aria-label="Stop response"]'),
+                    ("xpath", '//button[@aria-label="Stop response"]')],
+    "limit_banner": [("xpath", '//div[contains(text(), "limit reached")]')],
+    "limit_time": [("xpath", '//div[contains(text(), "limit reached")]/span')],
+    "user_message": [("css", '[data-testid="user-message"]')],
+    "assistant_message": [("css", 'div[data-is-streaming]'),
+                          ("css", 'div.font-claude-message')],
+    "chat_title": [("css", 'button[data-testid="chat-menu-trigger"] > div > div'),
+                   ("xpath", '//button[@data-testid="chat-menu-trigger"]/div/div')],
+    "artifact_button": [("css", 'button[aria-label="Preview contents"]:has(> div.artifact-block-cell)'),
+                        ("xpath", '//div[contains(@class, "artifact-block-cell ")]/parent::button[@aria-label="Preview contents"]')],
+    "artifact_title": [("css", 'div[class*="leading-tight"]')],  # Inside an artifact button
+    "artifact_panel": [("css", '#markdown-artifact')],
+    "artifact_heading": [("css", '#markdown-artifact h1')],
+    "artifact_paragraphs": [("css", '#markdown-artifact p')],
+    "copy_button": [("xpath", '//div[contains(text(),"Copy")]/parent::div/parent::button')],
+    "cloudflare_challenge": [("css", "iframe[src*='cloudflare']")],
+}
+
+BY = {"css": By.CSS_SELECTOR, "xpath": By.XPATH}
+
+_preferred = {}  # name -> index of the locator that matched last
+_handles = {}  # (driver session, name) -> element, for elements that live as long as the page
+_lock = threading.Lock()
+
+
+def locators(name:str)->list:
+    """Get the (By, value) locators of a selector, the one that matched last first"""
+    entries = [(BY[kind], value) for kind, value in SELECTORS[name]]
+    preferred = _preferred.get(name, 0)
+    return [entries[preferred]] + entries[:preferred] + entries[preferred + 1:]
+
+
+def _remember(name:str, locator:tuple):
+    kind = {by: kind for kind, by in BY.items()}[locator[0]]
+    _preferred[name] = SELECTORS[name].index((kind, locator[1]))
+
+
+def find_all(context, name:str)->list:
+    """Find all elements matching a selector in a driver or element. Returns [] if there are none"""
+    for locator in locators(name):
+        try:
+            elements = context.find_elements(*locator)
+        except WebDriverException:
+            continue  # eg :has() in an old browser
+        if elements:
+            _remember(name, locator)
+            return elements
+    return []
+
+
+def find(context, name:str):
+    """Find the first element matching a selector in a driver or element"""
+    elements = find_all(context, name)
+    if not elements:
+        raise NoSuchElementException(f"No element matches selector '{name}'")
+    return elements[0]
+
+
+def exists(context, name:str)->bool:
+    return bool(find_all(context, name))
+
+
+def wait_for(driver:webdriver.Chrome, name:str, timeout:float=10, clickable:bool=False):
+    """Wait until an element matching the selector is present (and clickable if asked) and return it"""
+    def present(d):
+        for element in find_all(d, name):
+            if not clickable or (element.is_displayed() and element.is_enabled()):
+                return element
+        return False
+    return WebDriverWait(driver, timeout, ignored_exceptions=(StaleElementReferenceException,)).until(present)
+
+
+def wait_for_all(driver:webdriver.Chrome, name:str, timeout:float=10)->list:
+    """Wait until at least one element matches the selector and return all of them"""
+    return WebDriverWait(driver, timeout).until(lambda d: find_all(d, name) or False)
+
+
+def cached(driver:webdriver.Chrome, name:str, timeout:float=10):
+    """Like wait_for, but reuse the element found earlier while it is still attached to the page"""
+    key = (driver.session_id, name)
+    with _lock:
+        element = _handles.get(key)
+    if element is not None:
+        try:
+            if driver.execute_script("return arguments[0].isConnected;", element):
+                return element
+        except WebDriverException:
+            pass
+    element = wait_for(driver, name, timeout)
+    with _lock:
+        _handles[key] = element
+    return element
+
+
+def js_selectors(*names)->dict:
+    """Get {name: [[kind, value], ...]} for passing selectors to an injected script (see FIND_JS)"""
+    return {name: [list(locator) for locator in SELECTORS[name]] for name in names}
+
+
+# Finds elements in injected scripts from the locators given by js_selectors()
+FIND_JS = """
+function findAll(locators, root) {
+    root = root || document;
+    for (const [kind, value] of locators) {
+        try {
+            if (kind === "css") {
+                const found = Array.from(root.querySelectorAll(value));
+                if (found.length) return found;
+            } else {
+                const snapshot = document.evaluate(value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+                const found = [];
+                for (let i = 0; i < snapshot.snapshotLength; i++) found.push(snapshot.snapshotItem(i));
+                if (found.length) return found;
+            }
+        } catch (e) {}
+    }
+    return [];
+}
+const findOne = (locators, root) => findAll(locators, root)[0] || null;
+"""
+
+# Checks the limit banner, the send button and the stop button in one call
+PROBE_SCRIPT = FIND_JS + """
+const selectors = arguments[0];
+const banner = findOne(selectors.limit_banner);
+const limitTime = findOne(selectors.limit_time);
+const send = findOne(selectors.send_button);
+return {
+    limit: !!banner,
+    limit_time: limitTime ? limitTime.innerText : null,
+    send_ready: !!send && !send.disabled && send.offsetParent !== null,
+    stop: !!findOne(selectors.stop_button),
+    input: !!findOne(selectors.prompt_input),
+};
+"""
+
+
+def probe(driver:webdriver.Chrome)->dict:
+    """Get the page state in a single call: {"limit", "limit_time", "send_ready", "stop", "input"}"""
+    return driver.execute_script(PROBE_SCRIPT, js_selectors("limit_banner", "limit_time", "send_button", "stop_button", "prompt_input"))
+
+
+def wait_for_probe(driver:webdriver.Chrome, condition, timeout:float, poll:float=0.5)->Optional[dict]:
+    """Probe the page until condition(state) is true. Returns that state, or None on timeout"""
+    deadline = time.time() + timeout
+    while True:
+        state = probe(driver)
+        if condition(state):
+            return state
+        if time.time() >= deadline:
+            return None
+        time.sleep(poll)
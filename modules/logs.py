@@ -0,0 +1,169 @@
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import datetime
+import threading
+import logging.handlers
+from modules.tracing import current_tags
+
+
+LOG_FILE = "automation.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+PROGRESS_INTERVAL_SECONDS = 30
+
+_listener = None
+_queue_handler = None
+_reporter = None
+_real_stdout = None
+
+
+class ContextFilter(logging.Filter):
+    """Attach the account/config/video/prompt tags of the logging thread (see tracing.trace_context)"""
+
+    def filter(self, record:logging.LogRecord)->bool:
+        record.context = current_tags()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, thread, logger, message and the context tags"""
+
+    def format(self, record:logging.LogRecord)->str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class ProgressReporter(threading.Thread):
+    """Prints a short summary now and then instead of every status line (quiet mode)"""
+
+    def __init__(self, interval:float):
+        super().__init__(name="progress", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.total = None
+        self.done = 0
+        self.failed = 0
+        self.latest = {}  # account -> (tags, last status line)
+
+    def status(self, line:str):
+        tags = current_tags()
+        with self.lock:
+            self.latest[tags.get("account", "-")] = (tags, line)
+
+    def video_finished(self, error:bool):
+        with self.lock:
+            self.done += 1
+            self.failed += bool(error)
+
+    def summary(self)->str:
+        with self.lock:
+            elapsed = time.time() - self.started_at
+            total = f"/{self.total}" if self.total else ""
+            lines = [f"[{elapsed / 60:.0f} min] {self.done}{total} videos finished, {self.failed} failed"]
+            for account, (tags, line) in sorted(self.latest.items()):
+                where = " ".join(f"{key} {tags[key]}" for key in ("video", "prompt") if tags.get(key) is not None)
+                lines.append(f"  [{account}] {where}: {line[:100]}")
+        return "\n".join(lines)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            console(self.summary())
+
+
+class QuietStdout:
+    """Replaces sys.stdout in quiet mode: every printed line is logged and remembered for the progress summary"""
+
+    def __init__(self, reporter:ProgressReporter):
+        self.reporter = reporter
+        self.buffers = threading.local()
+        self.logger = logging.getLogger("console")
+
+    def write(self, text:str)->int:
+        buffer = getattr(self.buffers, "text", "") + text.replace("\r", "\n")
+        *lines, self.buffers.text = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                self.logger.info(line.strip())
+                self.reporter.status(line.strip())
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self)->bool:
+        return False
+
+
+def console(message:str):
+    """Print to the real console, even in quiet mode"""
+    stream = _real_stdout or sys.stdout
+    stream.write(message + "\n")
+    stream.flush()
+
+
+def video_finished(error:bool=False):
+    """Count a finished video for the quiet mode progress summary"""
+    if _reporter is not None:
+        _reporter.video_finished(error)
+
+
+def setup_logging(quiet:bool=False, total_videos:int=None, max_bytes:int=LOG_MAX_BYTES, backups:int=LOG_BACKUPS,
+                  progress_interval:float=PROGRESS_INTERVAL_SECONDS):
+    """Send log records as JSON lines to automation.log (rotated by size) through a queue and a writer thread.
+
+    Called by the entry points, not on import. In quiet mode printed status lines only go to
+    the log, and a progress summary is printed every progress_interval seconds instead.
+    """
+    global _listener, _queue_handler, _reporter, _real_stdout
+    if _listener is not None:
+        return
+    file_handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    _queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    if quiet:
+        _reporter = ProgressReporter(progress_interval)
+        _reporter.total = total_videos
+        _real_stdout = sys.stdout
+        sys.stdout = QuietStdout(_reporter)
+        _reporter.start()
+
+
+def shutdown_logging():
+    """Print the last progress summary, give the console back and write out every queued record"""
+    global _listener, _queue_handler, _reporter, _real_stdout
+    if _reporter is not None:
+        _reporter.stopped.set()
+        console(_reporter.summary())
+        _reporter = None
+    if _real_stdout is not None:
+        sys.stdout = _real_stdout
+        _real_stdout = None
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener = None
+        _queue_handler = None
@@ -0,0 +1,225 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from typing import Optional
+from modules.storage import OUTPUT_ROOT, FileStore, VideoOutput, chapter_file_name, content_hash, open_video
+
+
+INDEX_PATH = os.path.join(OUTPUT_ROOT, "index.sqlite")
+
+
+class OutputIndex:
+    """Where every finished video is, keyed by (config, video number), with its chapter hashes, sizes and modification times.
+
+    Updated as each video is downloaded (see Journal.record_download), so checking whether a
+    video is already done is one primary key lookup instead of a crawl of outputFiles.
+    Only rebuild() walks the folders, for outputs written before the index existed.
+    """
+
+    def __init__(self, path:str=INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""CREATE TABLE IF NOT EXISTS videos (
+                config TEXT NOT NULL, video TEXT NOT NULL, account TEXT, output_dir TEXT NOT NULL, video_name TEXT NOT NULL,
+                location TEXT NOT NULL, output TEXT NOT NULL, chapters INTEGER NOT NULL, bytes INTEGER NOT NULL,
+                updated_at REAL NOT NULL, PRIMARY KEY (config, video))""")
+            connection.execute("""CREATE TABLE IF NOT EXISTS chapters (
+                config TEXT NOT NULL, video TEXT NOT NULL, file TEXT NOT NULL, bytes INTEGER NOT NULL, sha256 TEXT NOT NULL,
+                mtime REAL, PRIMARY KEY (config, video, file))""")
+            if "mtime" not in [column[1] for column in connection.execute("PRAGMA table_info(chapters)")]:
+                # Indexes from before modification times were kept are re-hashed on the first check
+                connection.execute("ALTER TABLE chapters ADD COLUMN mtime REAL")
+
+    def connect(self)->sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, config_name:str, video_number, account:Optional[str], video:VideoOutput, chapters:Optional[dict]=None):
+        """Index a saved video, replacing what was indexed for the same config and video number.
+
+        chapters ({position: content}) saves reading them again when the caller already has them.
+        """
+        if chapters is None:
+            chapters = video.read_chapters()
+        description = video.describe()
+        rows = []
+        for position, content in sorted(chapters.items()):
+            file_name = chapter_file_name(position)
+            if description["storage"] == "files":
+                # On disk, newlines may take two bytes
+                status = os.stat(os.path.join(video.location, file_name))
+                size, mtime = status.st_size, status.st_mtime
+            else:
+                size, mtime = len(content.encode("utf-8")), None
+            rows.append((config_name, str(video_number), file_name, size, content_hash(content), mtime))
+        with self.connect() as connection:
+            connection.execute("DELETE FROM chapters WHERE config = ? AND video = ?", (config_name, str(video_number)))
+            connection.executemany("INSERT INTO chapters VALUES (?, ?, ?, ?, ?, ?)", rows)
+            connection.execute("INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (config_name, str(video_number), account, video.account, video.video_name, video.location,
+                                json.dumps(description), len(rows), sum(row[3] for row in rows), time.time()))
+
+    def _entries(self, connection:sqlite3.Connection, where:str, parameters:tuple)->dict:
+        videos = connection.execute("SELECT config, video, account, location, output, chapters, bytes, updated_at FROM videos WHERE " + where,
+                                    parameters).fetchall()
+        entries = {}
+        for config, video, account, location, output, chapters, size, updated_at in videos:
+            entries[(config, video)] = {"config": config, "video": video, "account": account, "location": location,
+                                        "output": json.loads(output), "chapters": chapters, "bytes": size,
+                                        "updated_at": updated_at, "files": {}, "sizes": {}, "mtimes": {}}
+        for config, video, file_name, size, sha256, mtime in connection.execute(
+                "SELECT config, video, file, bytes, sha256, mtime FROM chapters WHERE " + where, parameters):
+            if (config, video) in entries:
+                entries[(config, video)]["files"][file_name] = sha256
+                entries[(config, video)]["sizes"][file_name] = size
+                entries[(config, video)]["mtimes"][file_name] = mtime
+        return entries
+
+    def lookup(self, config_name:str, video_number)->Optional[dict]:
+        """Get the indexed output of a video: location, output (VideoOutput.describe()), chapters, bytes, files (hashes), sizes and mtimes"""
+        with self.connect() as connection:
+            return self._entries(connection, "config = ? AND video = ?", (config_name, str(video_number))).get((config_name, str(video_number)))
+
+    def done(self, config_name:str, video_numbers:list)->dict:
+        """Get {video_number: entry} for the given videos that are indexed, a few hundred per query"""
+        numbers = [str(video_number) for video_number in video_numbers]
+        entries = {}
+        with self.connect() as connection:
+            for i in range(0, len(numbers), 500):
+                chunk = numbers[i:i + 500]
+                entries.update(self._entries(connection, f"config = ? AND video IN ({', '.join('?' * len(chunk))})", (config_name, *chunk)))
+        return {video_number: entries[(config_name, str(video_number))] for video_number in video_numbers
+                if (config_name, str(video_number)) in entries}
+
+    def remove(self, config_name:str, video_number):
+        with self.connect() as connection:
+            connection.execute("DELETE FROM chapters WHERE config = ? AND video = ?", (config_name, str(video_number)))
+            connection.execute("DELETE FROM videos WHERE config = ? AND video = ?", (config_name, str(video_number)))
+
+    def counts(self)->dict:
+        """Get {config: (videos, chapters, bytes)}"""
+        with self.connect() as connection:
+            rows = connection.execute("SELECT config, COUNT(*), SUM(chapters), SUM(bytes) FROM videos GROUP BY config").fetchall()
+        return {config: (videos, chapters or 0, size or 0) for config, videos, chapters, size in rows}
+
+
+def unchanged(entry:dict)->bool:
+    """Whether every chapter file still has the size and modification time it was indexed with (files storage only)"""
+    if entry["output"]["storage"] != "files" or not entry["files"]:
+        return False
+    try:
+        for file_name, size in entry["sizes"].items():
+            status = os.stat(os.path.join(entry["location"], file_name))
+            if status.st_size != size or status.st_mtime != entry["mtimes"].get(file_name):
+                return False
+    except OSError:
+        return False
+    return True
+
+
+def is_intact(entry:dict)->bool:
+    """Check that an indexed video's chapters still have the indexed hashes.
+
+    Chapter files untouched since they were indexed (same size and mtime) are trusted without
+    reading them; anything else is read and hashed again.
+    """
+    if unchanged(entry):
+        return True
+    try:
+        return bool(entry["files"]) and open_video(entry["output"]).hashes() == entry["files"]
+    except Exception:
+        return False
+
+
+def legacy_video(output_dir:str)->VideoOutput:
+    """Open an outputFiles/<account>/<video_name> folder as a video in the files store"""
+    account_dir = os.path.dirname(os.path.normpath(output_dir))
+    return VideoOutput(FileStore(os.path.dirname(account_dir)), os.path.basename(account_dir), os.path.basename(os.path.normpath(output_dir)))
+
+
+def rebuild(index:OutputIndex, journal_path:str, config_names:list, root:str=OUTPUT_ROOT)->int:
+    """Index every finished video in the journal, then every <account>-<config>/<title>_<video> folder under root.
+
+    Walks the whole tree, so it is only needed once for outputs from before the index.
+    Returns the number of videos indexed.
+    """
+    count = 0
+    if os.path.exists(journal_path):
+        downloads = {}
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get("step") == "download":
+                    downloads[(entry["config"], entry["video"])] = entry  # The latest download wins
+        for (config_name, video_number), entry in downloads.items():
+            try:
+                video = open_video(entry["output"]) if entry.get("output") else legacy_video(entry["output_dir"])
+                chapters = video.read_chapters()
+                if chapters:
+                    index.record(config_name, video_number, entry["account"], video, chapters)
+                    count += 1
+            except Exception as e:
+                print(f"Could not index video {video_number} of {config_name}: {e}")
+
+    if os.path.isdir(root):
+        # Longest config names first, so "a-b" isn't taken for config "b"
+        suffixes = sorted(config_names, key=len, reverse=True)
+        for account_dir in sorted(os.listdir(root)):
+            config_name = next((name for name in suffixes if account_dir.endswith("-" + name)), None)
+            if config_name is None or not os.path.isdir(os.path.join(root, account_dir)):
+                continue
+            account = account_dir[:-len(config_name) - 1]
+            for video_name in sorted(os.listdir(os.path.join(root, account_dir))):
+                number = re.search(r"_(\d+)$", video_name)
+                if number is None or index.lookup(config_name, number.group(1)) is not None:
+                    continue
+                video = VideoOutput(FileStore(root), account_dir, video_name)
+                chapters = video.read_chapters()
+                if chapters:
+                    index.record(config_name, number.group(1), account, video, chapters)
+                    count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index of finished videos by config and video number")
+    parser.add_argument("--index", default=INDEX_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("rebuild", help="Index the journal and every output folder (one full scan)")
+    build.add_argument("--journal", default=os.path.join(OUTPUT_ROOT, "journal.jsonl"))
+    build.add_argument("--configs", help="Comma separated config names (default: every folder in configs/)")
+    subparsers.add_parser("status", help="Show the number of indexed videos per config")
+    lookup = subparsers.add_parser("lookup", help="Show where a video is")
+    lookup.add_argument("config")
+    lookup.add_argument("video")
+    args = parser.parse_args()
+
+    index = OutputIndex(args.index)
+    if args.command == "rebuild":
+        if args.configs:
+            config_names = [name.strip() for name in args.configs.split(",")]
+        else:
+            config_names = [f for f in os.listdir("configs") if os.path.isdir(os.path.join("configs", f))] if os.path.isdir("configs") else []
+        print(f"Indexed {rebuild(index, args.journal, config_names)} videos")
+    elif args.command == "status":
+        for config_name, (videos, chapters, size) in sorted(index.counts().items()):
+            print(f"{config_name}: {videos} videos, {chapters} chapters, {size / 2**20:.1f} MB")
+    else:
+        entry = index.lookup(args.config, args.video)
+        if entry is None:
+            print(f"Video {args.video} of {args.config} is not indexed")
+            return 1
+        print(json.dumps({**entry, "intact": is_intact(entry)}, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import time
+import random
+import logging
+import threading
+
+
+# Short random delay added after every wait, so actions never fire at machine-exact intervals
+DEFAULT_JITTER_SECONDS = 0.15
+# Extra delay added when humanizing, like the fixed random_sleep ranges used before
+HUMANIZE_DELAY_SECONDS = (0.5, 1.5)
+LATENCY_SMOOTHING = 0.3  # Weight of the newest observation in the moving average
+
+
+class Pacer:
+    """Waits for actions to actually finish instead of sleeping for fixed ranges.
+
+    Every named action (eg "panel_open", "clipboard", "page_ready") keeps a moving
+    average of how long it took, which sets how soon and how often its condition is
+    polled. With humanize on, the old human-like delays are added on top.
+    """
+
+    def __init__(self, humanize:bool=False, jitter:float=DEFAULT_JITTER_SECONDS):
+        self.humanize = humanize
+        self.jitter_seconds = jitter
+        self.latencies = {}
+        self.lock = threading.Lock()
+
+    def expected(self, action:str):
+        with self.lock:
+            return self.latencies.get(action)
+
+    def observe(self, action:str, seconds:float):
+        with self.lock:
+            previous = self.latencies.get(action)
+            self.latencies[action] = seconds if previous is None else previous + LATENCY_SMOOTHING * (seconds - previous)
+
+    def jitter(self):
+        if self.humanize:
+            time.sleep(random.uniform(*HUMANIZE_DELAY_SECONDS))
+        elif self.jitter_seconds:
+            time.sleep(random.uniform(0, self.jitter_seconds))
+
+    def pause(self, min_seconds:float, max_seconds:float):
+        """A purely cosmetic delay: the given range when humanizing, a short jitter otherwise"""
+        if self.humanize:
+            time.sleep(random.uniform(min_seconds, max_seconds))
+        else:
+            self.jitter()
+
+    def wait(self, action:str, condition, timeout:float=10)->bool:
+        """Wait until condition() is true, then add a jitter. Returns False if it timed out"""
+        start = time.time()
+        expected = self.expected(action)
+        if expected:
+            # Don't poll while the action almost certainly hasn't finished yet
+            time.sleep(min(expected * 0.5, timeout))
+        poll = min(0.25, max(0.02, (expected or 0.5) / 5))
+        while True:
+            try:
+                if condition():
+                    self.observe(action, time.time() - start)
+                    self.jitter()
+                    return True
+            except Exception:
+                pass  # Elements can go stale while the page changes
+            if time.time() - start >= timeout:
+                logging.warning(f"Timed out after {timeout}s waiting for {action}")
+                return False
+            time.sleep(poll)
+
+    def settle(self, action:str, value, quiet:float=1.5, timeout:float=5)->bool:
+        """Wait until value() stops changing for quiet seconds (eg the URL after a client side redirect)"""
+        start = time.time()
+        last_value = value()
+        changed_at = start
+        while time.time() - changed_at < quiet:
+            if time.time() - start >= timeout:
+                return False
+            time.sleep(0.1)
+            current = value()
+            if current != last_value:
+                last_value, changed_at = current, time.time()
+        self.observe(action, changed_at - start)
+        self.jitter()
+        return True
+
+
+_pacer = Pacer()
+
+
+def configure(humanize:bool=False, jitter:float=DEFAULT_JITTER_SECONDS):
+    """Set how the shared pacer behaves (the config's "humanize" and "pacing_jitter" options)"""
+    _pacer.humanize = humanize
+    _pacer.jitter_seconds = jitter
+
+
+def wait(action:str, condition, timeout:float=10)->bool:
+    return _pacer.wait(action, condition, timeout)
+
+
+def settle(action:str, value, quiet:float=1.5, timeout:float=5)->bool:
+    return _pacer.settle(action, value, quiet, timeout)
+
+
+def pause(min_seconds:float, max_seconds:float):
+    _pacer.pause(min_seconds, max_seconds)
+
+
+def latencies()->dict:
+    """Get the learned latency of every action in seconds"""
+    with _pacer.lock:
+        return dict(_pacer.latencies)
@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import datetime
+import importlib
+import threading
+import traceback
+from modules.storage import OUTPUT_ROOT, MIN_CHAPTER_CHARS, MIN_CHAPTER_RATIO, content_hash
+from modules.tracing import record_span
+
+
+# Transforms run in this order unless the config's "postprocess" option lists its own.
+# Each one takes the video document and returns what goes into the manifest under its name.
+DEFAULT_TRANSFORMS = ["normalize", "validate", "stats", "merge"]
+MANIFEST_FILE = "manifest.json"
+FULL_SCRIPT_FILE = "Full-Script.txt"
+WORDS_PER_MINUTE = 150  # Narration speed for the duration estimate
+DUPLICATE_SIMILARITY = 0.8  # Share of 5-word shingles two chapters must have in common to count as duplicates
+SENTENCE_END = re.compile(r"[.!?…\"'”’)\]*_]\s*$")
+
+
+def write_output(document:dict, file_name:str, text:str)->str:
+    """Write a file next to the video's chapters (atomically) and list it in the manifest. Returns its path"""
+    os.makedirs(document["output_dir"], exist_ok=True)
+    path = os.path.join(document["output_dir"], file_name)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+    document["outputs"].append(path)
+    return path
+
+
+def strip_markdown(text:str)->str:
+    """Turn artifact markdown into plain narration text"""
+    text = re.sub(r"```[^\n]*\n(.*?)```", r"\1", text, flags=re.DOTALL)
+    text = re.sub(r"!\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"^\s{0,3}#{1,6}\s*", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^\s{0,3}>\s?", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^\s*(?:[-*+]|\d+\.)\s+", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$", "", text, flags=re.MULTILINE)
+    text = re.sub(r"(\*\*|__)(.+?)\1", r"\2", text)
+    text = re.sub(r"(?<![\w*])([*_])(?!\s)(.+?)(?<!\s)\1(?![\w*])", r"\2", text)
+    text = text.replace("`", "")
+    text = "\n".join(line.rstrip() for line in text.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", text).strip() + "\n"
+
+
+def normalize(document:dict)->dict:
+    """Strip the markdown from every chapter. Later transforms see the plain text"""
+    before = sum(len(text) for text in document["chapters"].values())
+    document["chapters"] = {position: strip_markdown(text) for position, text in document["chapters"].items()}
+    return {"characters_removed": before - sum(len(text) for text in document["chapters"].values())}
+
+
+def shingles(text:str, size:int=5)->set:
+    words = re.findall(r"\w+", text.lower())
+    return {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 0))}
+
+
+def validate(document:dict)->dict:
+    """Find missing, empty, truncated and duplicated chapters"""
+    chapters = document["chapters"]
+    problems = []
+    for position in range(1, max(chapters, default=0) + 1):
+        if position not in chapters:
+            problems.append({"chapter": position, "problem": "missing"})
+    lengths = {position: len(text.strip()) for position, text in chapters.items()}
+    median = sorted(lengths.values())[len(lengths) // 2] if lengths else 0
+    for position, text in sorted(chapters.items()):
+        if not text.strip():
+            problems.append({"chapter": position, "problem": "empty"})
+        elif lengths[position] < MIN_CHAPTER_CHARS or lengths[position] < median * MIN_CHAPTER_RATIO:
+            problems.append({"chapter": position, "problem": "too short"})
+        elif not SENTENCE_END.search(text):
+            problems.append({"chapter": position, "problem": "ends mid-sentence"})
+
+    seen = {}
+    chapter_shingles = {position: shingles(text) for position, text in chapters.items()}
+    for position, text in sorted(chapters.items()):
+        digest = hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+        if text.strip() and digest in seen:
+            problems.append({"chapter": position, "problem": f"duplicate of chapter {seen[digest]}"})
+            continue
+        seen.setdefault(digest, position)
+        for other in range(1, position):
+            a, b = chapter_shingles[position], chapter_shingles.get(other, set())
+            if a and b and len(a & b) / min(len(a), len(b)) >= DUPLICATE_SIMILARITY:
+                problems.append({"chapter": position, "problem": f"near duplicate of chapter {other}"})
+                break
+    return {"ok": not problems, "problems": problems}
+
+
+def stats(document:dict)->dict:
+    """Words, characters and paragraphs per chapter, and the estimated narration time"""
+    chapters = {}
+    for position, text in sorted(document["chapters"].items()):
+        chapters[str(position)] = {"words": len(text.split()), "characters": len(text),
+                                   "paragraphs": len([p for p in text.split("\n\n") if p.strip()])}
+    words = sum(chapter["words"] for chapter in chapters.values())
+    return {"words": words, "characters": sum(chapter["characters"] for chapter in chapters.values()),
+            "narration_minutes": round(words / WORDS_PER_MINUTE, 1), "chapters": chapters}
+
+
+def merge(document:dict)->dict:
+    """Write all chapters in order as one full script"""
+    text = "\n\n".join(text.strip() for _, text in sorted(document["chapters"].items())) + "\n"
+    return {"file": write_output(document, FULL_SCRIPT_FILE, text), "words": len(text.split())}
+
+
+TRANSFORMS = {"normalize": normalize, "validate": validate, "stats": stats, "merge": merge}
+
+
+def transform_names(config:dict)->list:
+    """Get the transforms selected by the config's "postprocess" option: true for the defaults, or a list.
+
+    Custom transforms are given as "package.module:function".
+    """
+    option = config.get("postprocess", False)
+    if option is True:
+        return list(DEFAULT_TRANSFORMS)
+    return list(option or [])
+
+
+def check_transforms(names:list):
+    for name in names:
+        if name not in TRANSFORMS and ":" not in name:
+            raise ValueError(f"Unknown post-processing transform: {name} (expected one of {', '.join(TRANSFORMS)} or module:function)")
+
+
+def load_transform(name:str):
+    if name in TRANSFORMS:
+        return TRANSFORMS[name]
+    module_name, function_name = name.split(":", 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def output_folder(description:dict)->str:
+    """Where the manifest and the other outputs of a video go: its chapter folder, or one next to the store"""
+    if description["storage"] == "files":
+        return os.path.join(description["path"], description["account"], description["video_name"])
+    return os.path.join(os.path.dirname(description["path"]) or OUTPUT_ROOT, description["account"], description["video_name"])
+
+
+def process_document(document:dict, names:list)->dict:
+    """Run the transforms on one video and write its manifest. Runs in a worker process"""
+    started = time.time()
+    document["outputs"] = []
+    manifest = {
+        "account": document["account"],
+        "config": document["config"],
+        "video_number": document["video_number"],
+        "video_name": document["video_name"],
+        "source": document["source"],
+        "chapters": [{"position": position, "sha256": content_hash(text), "characters": len(text)}
+                     for position, text in sorted(document["chapters"].items())],
+        "transforms": {},
+    }
+    for name in names:
+        try:
+            manifest["transforms"][name] = load_transform(name)(document)
+        except Exception as e:
+            manifest["transforms"][name] = {"error": f"{type(e).__name__}: {e}"}
+    manifest["outputs"] = document["outputs"]
+    manifest["processed_at"] = datetime.datetime.now().isoformat()
+    manifest["seconds"] = round(time.time() - started, 3)
+    write_output(document, MANIFEST_FILE, json.dumps(manifest, indent=4))
+    return {"manifest": os.path.join(document["output_dir"], MANIFEST_FILE), "started": started, "finished": time.time(),
+            "problems": manifest["transforms"].get("validate", {}).get("problems", []),
+            "errors": [name for name, result in manifest["transforms"].items() if isinstance(result, dict) and "error" in result]}
+
+
+class PostProcessor:
+    """Runs the post-processing transforms of finished videos in a process pool, while later videos are generated.
+
+    Workers submit every video they finish; the chapters are read once and sent to a worker
+    process, which runs the transforms in order and writes one manifest per video.
+    """
+
+    def __init__(self, config:dict, config_name:str, max_workers:int=None):
+        from concurrent.futures import ProcessPoolExecutor  # multiprocessing is slow to import, main only needs it for a run
+        self.names = transform_names(config)
+        check_transforms(self.names)
+        self.config_name = config_name
+        self.executor = ProcessPoolExecutor(max_workers=max_workers or config.get("postprocess_workers") or min(4, os.cpu_count() or 1))
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.results = {}  # video number -> result of process_document, or {"error": ...}
+
+    def submit(self, video, video_number, account:str):
+        """Queue a saved VideoOutput for post-processing without waiting for it"""
+        description = video.describe()
+        document = {"account": account, "config": self.config_name, "video_number": video_number, "video_name": video.video_name,
+                    "source": description, "output_dir": output_folder(description), "chapters": video.read_chapters()}
+        future = self.executor.submit(process_document, document, self.names)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(lambda f: self.done(video_number, f))
+
+    def done(self, video_number, future):
+        with self.lock:
+            self.pending.discard(future)
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Post-processing video {video_number} failed: {e}")
+            logging.error(f"Post-processing video {video_number} failed: {traceback.format_exc()}")
+            result = {"error": str(e)}
+        else:
+            record_span("postprocess", result["started"], result["finished"], video=video_number)
+            if result["problems"] or result["errors"]:
+                logging.warning(f"Post-processing video {video_number}: problems {result['problems']}, failed transforms {result['errors']}")
+        with self.lock:
+            self.results[video_number] = result
+
+    def close(self):
+        """Wait for every queued video and print a summary"""
+        with self.lock:
+            waiting = len(self.pending)
+        if waiting:
+            print(f"Waiting for {waiting} videos to be post-processed...")
+        self.executor.shutdown(wait=True)
+        if not self.results:
+            return
+        flagged = [str(video_number) for video_number, result in self.results.items()
+                   if "error" in result or result["problems"] or result["errors"]]
+        print(f"Post-processed {len(self.results)} videos" + (f", check videos {', '.join(flagged)} (see their {MANIFEST_FILE})" if flagged else ""))
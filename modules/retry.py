@@ -0,0 +1,48 @@
+import time
+import random
+import logging
+import traceback
+
+
+DEFAULT_RETRY_POLICY = {"attempts": 3, "backoff": 2.0, "max_delay": 60.0}
+
+
+def get_retry_policy(config:dict)->dict:
+    """Get the retry policy from the config's optional "retry" section"""
+    return {**DEFAULT_RETRY_POLICY, **config.get("retry", {})}
+
+
+def retry_step(name:str, func, attempts:int=3, backoff:float=2.0, max_delay:float=60.0,
+               before_retry=None, already_done=None, give_up_on:tuple=()):
+    """Call func, retrying with exponential backoff if it raises.
+
+    Before each retry before_retry() is called (eg to reload the page), then
+    already_done() is checked so that a step that actually succeeded isn't repeated.
+    Exceptions in give_up_on are raised straight away.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except give_up_on:
+            raise
+        except Exception as e:
+            if attempt == attempts:
+                print(f"{name} failed after {attempts} attempts: {e}")
+                logging.error(f"{name} failed after {attempts} attempts: {traceback.format_exc()}")
+                raise
+            delay = min(backoff ** attempt, max_delay) * random.uniform(0.8, 1.2)
+            print(f"{name} failed ({e}), retrying in {delay:.0f}s (attempt {attempt + 1}/{attempts})")
+            logging.warning(f"{name} failed on attempt {attempt}: {traceback.format_exc()}")
+            time.sleep(delay)
+
+        try:
+            if before_retry is not None:
+                before_retry()
+            if already_done is not None and already_done():
+                print(f"{name} had already succeeded, not repeating it")
+                return None
+        except give_up_on:
+            raise
+        except Exception as e:
+            print(f"Error preparing retry of {name}: {e}")
+            logging.error(f"Error preparing retry of {name}: {traceback.format_exc()}")
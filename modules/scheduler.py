@@ -0,0 +1,120 @@
+import os
+import json
+import datetime
+import threading
+import logging
+import traceback
+from collections import deque
+from typing import Optional
+from modules.tracing import span
+from modules import wakeup
+
+
+def quota_file_path(account:str)->str:
+    return os.path.join("accounts", account, "quota.json")
+
+
+def load_reactivation_time(account:str)->Optional[datetime.datetime]:
+    """Load when the account's quota returns, or None if it isn't known to be exhausted"""
+    try:
+        with open(quota_file_path(account), "r") as f:
+            reactivation_at = datetime.datetime.fromisoformat(json.load(f)["reactivation_at"])
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+    return reactivation_at if reactivation_at > datetime.datetime.now() else None
+
+
+def save_reactivation_time(account:str, reactivation_at:datetime.datetime):
+    """Save when the account's quota returns so later runs skip it until then"""
+    try:
+        with open(quota_file_path(account), "w") as f:
+            json.dump({"reactivation_at": reactivation_at.isoformat()}, f)
+    except OSError:
+        logging.error(f"Error saving quota state for {account}: {traceback.format_exc()}")
+
+
+class QuotaScheduler:
+    """Hands out videos to accounts that still have quota.
+
+    An account that hits the message limit is marked exhausted until its reactivation
+    time, its video goes back to the front of the queue for another account, and the
+    account's worker sleeps until exactly that time (or until the batch is finished).
+    wakeup.wake() (SIGUSR1 or the wake file) gives every account its quota back early.
+    """
+
+    def __init__(self, accounts:list, video_numbers:list):
+        self.condition = threading.Condition()
+        self.pending = deque(video_numbers)
+        self.in_progress = 0
+        self.reactivation = {}
+        self.wake_count = wakeup.wake_count()
+        for account in accounts:
+            reactivation_at = load_reactivation_time(account)
+            if reactivation_at is not None:
+                print(f"[{account}] Limit reached earlier, waiting until {reactivation_at:%H:%M} before using it")
+                self.reactivation[account] = reactivation_at
+
+    def has_quota(self, account:str)->bool:
+        reactivation_at = self.reactivation.get(account)
+        if reactivation_at is None:
+            return True
+        if wakeup.woken_since(self.wake_count):
+            print("Woken up, trying every account again")
+            self.wake_count = wakeup.wake_count()
+            self.reactivation.clear()
+            return True
+        if datetime.datetime.now() >= reactivation_at:
+            del self.reactivation[account]
+            print(f"[{account}] Quota is back")
+            return True
+        return False
+
+    def next_video(self, account:str, idle=None):
+        """Get the next video for the account, sleeping while it has no quota. Returns None when the batch is done.
+
+        idle() is called (once) before the account would have to wait, eg to finish a pipelined
+        video the worker still holds.
+        """
+        with self.condition:
+            while True:
+                if not self.pending and self.in_progress == 0:
+                    return None
+                if idle is not None and (not self.pending or not self.has_quota(account)):
+                    callback, idle = idle, None
+                    self.condition.release()
+                    try:
+                        callback()
+                    finally:
+                        self.condition.acquire()
+                elif not self.has_quota(account):
+                    with span("limit_wait", account=account):
+                        while not self.has_quota(account) and (self.pending or self.in_progress):
+                            timeout = (self.reactivation[account] - datetime.datetime.now()).total_seconds()
+                            # Wake up now and then to notice wakeup.wake()
+                            self.condition.wait(timeout=min(max(timeout, 0), wakeup.CHECK_SECONDS))
+                elif self.pending:
+                    self.in_progress += 1
+                    return self.pending.popleft()
+                else:
+                    # Other accounts may still hand videos back
+                    self.condition.wait()
+
+    def lease_lost(self, video_number)->bool:
+        """Whether another worker may have taken the video over (only with a shared queue)"""
+        return False
+
+    def finish_video(self, video_number, error:Optional[str]=None):
+        """Mark a video as done (successfully or not)"""
+        with self.condition:
+            self.in_progress -= 1
+            self.condition.notify_all()
+
+    def limit_reached(self, account:str, video_number, reactivation_at:datetime.datetime):
+        """Record that the account is out of quota and give its video to someone else"""
+        with self.condition:
+            self.reactivation[account] = reactivation_at
+            self.pending.appendleft(video_number)
+            self.in_progress -= 1
+            self.condition.notify_all()
+        save_reactivation_time(account, reactivation_at)
+        print(f"[{account}] Limit reached, rescheduling video {video_number}. Account resumes at {reactivation_at:%H:%M}")
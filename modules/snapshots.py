@@ -0,0 +1,173 @@
+import os
+import json
+import gzip
+import time
+import logging
+import datetime
+import traceback
+from typing import Optional
+from modules.locators import js_selectors, probe, FIND_JS
+from modules.tracing import current_tags
+
+
+# Page snapshots recorded during real runs ("record_snapshots" config option), replayed
+# offline by benchmarks/bench_extraction.py. One gzipped JSON file per snapshot.
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_VERSION = 1
+
+_directory = None
+
+
+# Opens every artifact panel in turn and keeps its HTML, then returns the whole page with
+# the scripts removed and the style sheets inlined. The artifact buttons, the open panel and
+# the copy buttons are marked with data-replay-* attributes so the replay page can switch panels.
+RECORD_SCRIPT = FIND_JS + """
+const selectors = arguments[0], panelTimeoutMs = arguments[1];
+const resolve = arguments[arguments.length - 1];
+
+const panelText = () => {
+    const panel = findOne(selectors.artifact_panel);
+    return panel ? panel.innerText : null;
+};
+
+async function waitForPanel(previousText) {
+    const start = performance.now();
+    let lastText = null;
+    while (performance.now() - start < panelTimeoutMs) {
+        const text = panelText();
+        if (text && text !== previousText && text === lastText) return;
+        lastText = text;
+        await new Promise((r) => setTimeout(r, 100));
+    }
+}
+
+function styleSheets() {
+    const css = [];
+    for (const sheet of document.styleSheets) {
+        try {
+            css.push(Array.from(sheet.cssRules).map((rule) => rule.cssText).join("\\n"));
+        } catch (e) {}  // Cross-origin sheets can't be read
+    }
+    return css.join("\\n");
+}
+
+(async () => {
+    const buttons = findAll(selectors.artifact_button);
+    const panels = {};
+    let previousText = null;
+    for (let i = 0; i < buttons.length; i++) {
+        buttons[i].scrollIntoView({block: "center"});
+        buttons[i].click();
+        await waitForPanel(previousText);
+        const panel = findOne(selectors.artifact_panel);
+        panels[i + 1] = panel ? panel.outerHTML : null;
+        previousText = panelText();
+    }
+
+    const marked = [];
+    const mark = (element, name, value) => {
+        element.setAttribute(name, value);
+        marked.push([element, name]);
+    };
+    buttons.forEach((button, i) => mark(button, "data-replay-artifact", String(i + 1)));
+    const openPanel = findOne(selectors.artifact_panel);
+    if (openPanel) mark(openPanel, "data-replay-panel", "");
+    findAll(selectors.copy_button).forEach((button) => mark(button, "data-replay-copy", ""));
+
+    const clone = document.documentElement.cloneNode(true);
+    marked.forEach(([element, name]) => element.removeAttribute(name));
+    clone.querySelectorAll("script, noscript, iframe, link[rel=stylesheet], link[rel=preload], link[rel=modulepreload]")
+        .forEach((element) => element.remove());
+    const style = document.createElement("style");
+    style.textContent = styleSheets();
+    (clone.querySelector("head") || clone).appendChild(style);
+
+    return {html: "<!DOCTYPE html>\\n" + clone.outerHTML, panels: panels, url: location.href, title: document.title};
+})().then(resolve, (error) => resolve({error: String(error)}));
+"""
+
+
+def configure(directory:Optional[str]):
+    """Record snapshots to directory from now on, or stop recording if it is None"""
+    global _directory
+    _directory = directory
+
+
+def configure_from(config:dict):
+    """Apply the config's "record_snapshots" option: true for SNAPSHOT_DIR, or a folder"""
+    option = config.get("record_snapshots", False)
+    configure((SNAPSHOT_DIR if option is True else option) or None)
+
+
+def snapshot_path(directory:str, snapshot_id:str)->str:
+    return os.path.join(directory, snapshot_id + ".json.gz")
+
+
+def save_snapshot(directory:str, snapshot:dict)->str:
+    """Write a snapshot atomically. Returns its path"""
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(directory, snapshot["id"])
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load_snapshot(path:str)->dict:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_snapshots(directory:str=SNAPSHOT_DIR)->list:
+    """Get the paths of the snapshots in a folder, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json.gz"))
+
+
+def capture_page(driver, panel_timeout:float=10)->dict:
+    """Get {"html", "panels", "url", "title"} of the page open in the driver"""
+    driver.set_script_timeout(300)
+    selectors = js_selectors("artifact_button", "artifact_panel", "copy_button")
+    page = driver.execute_async_script(RECORD_SCRIPT, selectors, panel_timeout * 1000)
+    if "error" in page:
+        raise Exception(f"Recording the page failed: {page['error']}")
+    return page
+
+
+def record(driver, kind:str, video_number=None, video=None, reactivation_time:Optional[str]=None)->Optional[str]:
+    """Save a snapshot of the page with what the live run got out of it, if recording is on.
+
+    kind is "conversation" (after a video's artifacts were downloaded, pass the saved
+    VideoOutput) or "limit" (when the message limit banner is shown). Errors are only
+    logged, recording never breaks a run. Returns the snapshot's path.
+    """
+    directory = _directory
+    if directory is None:
+        return None
+    try:
+        started = time.time()
+        state = probe(driver)
+        page = capture_page(driver)
+        expected = {"limit": state["limit"], "reactivation_time": reactivation_time or state["limit_time"],
+                    "artifact_count": len(page["panels"])}
+        if video is not None:
+            chapters = video.read_chapters()
+            expected["video_name"] = video.video_name
+            expected["chapter_chars"] = {str(position): len(content) for position, content in sorted(chapters.items())}
+            expected["hashes"] = video.hashes()
+        tags = current_tags()
+        if video_number is None:
+            video_number = tags.get("video")
+        snapshot_id = "-".join(str(part) for part in (datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f"), kind,
+                                                      tags.get("account"), video_number) if part is not None)
+        snapshot = {"id": snapshot_id, "version": SNAPSHOT_VERSION, "kind": kind, "recorded_at": datetime.datetime.now().isoformat(),
+                    "url": page["url"], "title": page["title"], "tags": tags, "video_number": video_number,
+                    "html": page["html"], "panels": page["panels"], "expected": expected}
+        path = save_snapshot(directory, snapshot)
+        print(f"Recorded page snapshot {path} in {time.time() - started:.1f}s")
+        return path
+    except Exception as e:
+        print("Error recording page snapshot:", e)
+        logging.error(f"Error recording a {kind} snapshot: {traceback.format_exc()}")
+        return None
@@ -0,0 +1,320 @@
+"""Storage backends for generated chapters.
+
+"files" keeps the classic outputFiles/<account>/<video_name>/Chapter-N.txt layout, "sqlite"
+keeps every chapter in one outputFiles/chapters.sqlite database and "jsonl" appends every
+chapter to one compressed archive per run. Chapter order always comes from the artifact
+position, never from file times. Archives can be exported back to the files layout with
+
+    python -m modules.storage export outputFiles/chapters.sqlite
+"""
+import os
+import io
+import sys
+import gzip
+import json
+import zlib
+import time
+import sqlite3
+import hashlib
+import argparse
+import datetime
+import threading
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+STORAGE_KINDS = ("files", "sqlite", "jsonl")
+COMPRESSIONS = ("zlib", "zstd", "none")
+MIN_CHAPTER_CHARS = 200
+MIN_CHAPTER_RATIO = 0.25  # Chapters much shorter than the median are probably truncated
+OUTPUT_ROOT = "outputFiles"
+
+
+def content_hash(content:str)->str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def chapter_file_name(position:int)->str:
+    return f"Chapter-{position}.txt"
+
+
+def check_compression(compression:str)->str:
+    """Fall back to zlib if zstd was asked for but the zstandard package isn't installed"""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression} (expected one of {', '.join(COMPRESSIONS)})")
+    if compression == "zstd" and zstandard is None:
+        print("zstandard is not installed, using zlib compression instead")
+        return "zlib"
+    return compression
+
+
+def compress(data:bytes, compression:str)->bytes:
+    if compression == "zlib":
+        return zlib.compress(data, 6)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    return data
+
+
+def decompress(data:bytes, compression:str)->bytes:
+    if compression == "zlib":
+        return zlib.decompress(data)
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+class VideoOutput:
+    """The chapters of one video in a store"""
+
+    def __init__(self, store, account:str, video_name:str):
+        self.store = store
+        self.account = account
+        self.video_name = video_name
+
+    @property
+    def location(self)->str:
+        return self.store.location(self.account, self.video_name)
+
+    def write_chapter(self, position:int, title:str, content:str):
+        self.store.write_chapter(self.account, self.video_name, position, title, content)
+
+    def read_chapters(self)->dict:
+        """Get {position: content} of every saved chapter"""
+        return self.store.read_chapters(self.account, self.video_name)
+
+    def hashes(self)->dict:
+        return {chapter_file_name(position): content_hash(content) for position, content in sorted(self.read_chapters().items())}
+
+    def describe(self)->dict:
+        """Everything needed to open this video again with open_video()"""
+        return {"storage": self.store.kind, "path": self.store.path, "account": self.account, "video_name": self.video_name}
+
+
+class FileStore:
+    """Chapter-N.txt files in outputFiles/<account>/<video_name>/, each written atomically"""
+
+    kind = "files"
+
+    def __init__(self, path:str=OUTPUT_ROOT):
+        self.path = path
+
+    def location(self, account:str, video_name:str)->str:
+        return os.path.join(self.path, account, video_name)
+
+    def write_chapter(self, account:str, video_name:str, position:int, title:str, content:str):
+        video_dir = self.location(account, video_name)
+        os.makedirs(video_dir, exist_ok=True)
+        file_path = os.path.join(video_dir, chapter_file_name(position))
+        temp_path = file_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, file_path)
+
+    def read_chapters(self, account:str, video_name:str)->dict:
+        video_dir = self.location(account, video_name)
+        chapters = {}
+        if not os.path.isdir(video_dir):
+            return chapters
+        for file_name in os.listdir(video_dir):
+            if file_name.startswith("Chapter-") and file_name.endswith(".txt") and file_name[8:-4].isdigit():
+                with open(os.path.join(video_dir, file_name), "r", encoding="utf-8") as f:
+                    chapters[int(file_name[8:-4])] = f.read()
+        return chapters
+
+
+class SQLiteStore:
+    """All chapters in one SQLite database, written in a transaction per chapter"""
+
+    kind = "sqlite"
+
+    def __init__(self, path:str=os.path.join(OUTPUT_ROOT, "chapters.sqlite"), compression:str="zlib"):
+        self.path = path
+        self.compression = check_compression(compression)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""CREATE TABLE IF NOT EXISTS chapters (
+                account TEXT NOT NULL, video_name TEXT NOT NULL, position INTEGER NOT NULL,
+                title TEXT, content BLOB NOT NULL, compression TEXT NOT NULL, sha256 TEXT NOT NULL,
+                saved_at REAL NOT NULL, PRIMARY KEY (account, video_name, position))""")
+
+    def connect(self)->sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def location(self, account:str, video_name:str)->str:
+        return f"{self.path}#{account}/{video_name}"
+
+    def write_chapter(self, account:str, video_name:str, position:int, title:str, content:str):
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO chapters VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (account, video_name, position, title, compress(content.encode("utf-8"), self.compression),
+                                self.compression, content_hash(content), time.time()))
+
+    def read_chapters(self, account:str, video_name:str)->dict:
+        with self.connect() as connection:
+            rows = connection.execute("SELECT position, content, compression FROM chapters WHERE account = ? AND video_name = ?",
+                                      (account, video_name)).fetchall()
+        return {position: decompress(content, compression).decode("utf-8") for position, content, compression in rows}
+
+    def iter_chapters(self):
+        """Yield (account, video_name, position, title, content) for every chapter"""
+        with self.connect() as connection:
+            rows = connection.execute("SELECT account, video_name, position, title, content, compression FROM chapters "
+                                      "ORDER BY account, video_name, position").fetchall()
+        for account, video_name, position, title, content, compression in rows:
+            yield account, video_name, position, title, decompress(content, compression).decode("utf-8")
+
+
+class JsonlStore:
+    """One append-only JSONL archive per run; every chapter is one line, compressed as its own gzip member or zstd frame"""
+
+    kind = "jsonl"
+
+    def __init__(self, path:str=None, compression:str="zlib"):
+        compression = check_compression(compression)
+        if path is None:
+            extension = {"zlib": ".jsonl.gz", "zstd": ".jsonl.zst", "none": ".jsonl"}[compression]
+            path = os.path.join(OUTPUT_ROOT, f"run-{datetime.datetime.now():%Y%m%d-%H%M%S}{extension}")
+        self.path = path
+        self.compression = "zstd" if path.endswith(".zst") else "zlib" if path.endswith(".gz") else "none"
+        self.lock = threading.Lock()
+        # {(account, video_name): {position: content}}, read from the archive once and kept up to date by
+        # write_chapter, so reading a video's chapters doesn't decompress the whole archive every time.
+        # It is read again if the archive's size or mtime changes behind our back
+        self.chapters = None
+        self.chapters_stat = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def location(self, account:str, video_name:str)->str:
+        return f"{self.path}#{account}/{video_name}"
+
+    def write_chapter(self, account:str, video_name:str, position:int, title:str, content:str):
+        line = json.dumps({"account": account, "video_name": video_name, "position": position, "title": title,
+                           "content": content, "sha256": content_hash(content), "saved_at": time.time()}) + "\n"
+        data = line.encode("utf-8")
+        if self.compression == "zlib":
+            data = gzip.compress(data)
+        elif self.compression == "zstd":
+            data = zstandard.ZstdCompressor(level=6).compress(data)
+        # A record is only complete once its whole member/frame is on disk
+        with self.lock:
+            with open(self.path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            if self.chapters is not None:
+                self.chapters.setdefault((account, video_name), {})[position] = content
+                self.chapters_stat = self.stat()
+
+    def iter_records(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            if self.compression == "zlib":
+                stream = gzip.GzipFile(fileobj=f)
+            elif self.compression == "zstd":
+                stream = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            else:
+                stream = f
+            try:
+                for line in io.TextIOWrapper(stream, encoding="utf-8"):
+                    yield json.loads(line)
+            except (EOFError, json.JSONDecodeError, zlib.error):
+                pass  # The last record was cut off by a crash
+
+    def stat(self)->Optional[tuple]:
+        try:
+            status = os.stat(self.path)
+        except OSError:
+            return None
+        return status.st_size, status.st_mtime
+
+    def read_chapters(self, account:str, video_name:str)->dict:
+        with self.lock:
+            if self.chapters is None or self.chapters_stat != self.stat():
+                self.chapters_stat = self.stat()
+                self.chapters = {}
+                for record in self.iter_records():
+                    self.chapters.setdefault((record["account"], record["video_name"]), {})[record["position"]] = record["content"]
+            return dict(self.chapters.get((account, video_name), {}))
+
+    def iter_chapters(self):
+        """Yield (account, video_name, position, title, content) for every chapter, latest version only"""
+        latest = {}
+        for record in self.iter_records():
+            latest[(record["account"], record["video_name"], record["position"])] = record
+        for (account, video_name, position), record in sorted(latest.items()):
+            yield account, video_name, position, record["title"], record["content"]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+_opened_archives = {}  # path -> JsonlStore opened by open_video
+
+
+def get_store(config:dict):
+    """Get the store selected by the config's "storage" and "storage_compression" options.
+
+    Stores are shared for the whole run, so a "jsonl" run writes a single archive.
+    """
+    kind = config.get("storage", "files")
+    compression = config.get("storage_compression", "zlib")
+    if kind not in STORAGE_KINDS:
+        raise ValueError(f"Unknown storage: {kind} (expected one of {', '.join(STORAGE_KINDS)})")
+    with _stores_lock:
+        if (kind, compression) not in _stores:
+            if kind == "sqlite":
+                _stores[(kind, compression)] = SQLiteStore(compression=compression)
+            elif kind == "jsonl":
+                _stores[(kind, compression)] = JsonlStore(compression=compression)
+            else:
+                _stores[(kind, compression)] = FileStore()
+        return _stores[(kind, compression)]
+
+
+def open_video(description:dict)->VideoOutput:
+    """Open a video described by VideoOutput.describe()"""
+    kind = description.get("storage", "files")
+    if kind == "sqlite":
+        store = SQLiteStore(description["path"])
+    elif kind == "jsonl":
+        # Archives are opened once per path (the run's own one is the shared store), so checking many
+        # videos of an archive decompresses it once instead of once per video
+        with _stores_lock:
+            store = next((store for store in _stores.values() if isinstance(store, JsonlStore) and store.path == description["path"]), None)
+            if store is None:
+                store = _opened_archives.setdefault(description["path"], JsonlStore(description["path"]))
+    else:
+        store = FileStore(description.get("path", OUTPUT_ROOT))
+    return VideoOutput(store, description["account"], description["video_name"])
+
+
+def export_to_files(path:str, destination:str=OUTPUT_ROOT)->int:
+    """Write every chapter of a SQLite database or JSONL archive as <destination>/<account>/<video_name>/Chapter-N.txt"""
+    source = SQLiteStore(path) if path.endswith((".sqlite", ".db")) else JsonlStore(path)
+    target = FileStore(destination)
+    count = 0
+    for account, video_name, position, title, content in source.iter_chapters():
+        target.write_chapter(account, video_name, position, title, content)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export stored chapters to the Chapter-N.txt layout")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Export a SQLite database or JSONL archive")
+    export.add_argument("path")
+    export.add_argument("--dest", default=OUTPUT_ROOT)
+    args = parser.parse_args()
+    count = export_to_files(args.path, args.dest)
+    print(f"Exported {count} chapters to {args.dest}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import datetime
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+
+TRACE_DIR = "logs"
+PHASES = ("login", "page_load", "prompt_typing", "first_token", "generation",
+          "artifact_extraction", "file_write", "limit_wait")
+
+_tracer = None
+_context = threading.local()
+
+
+class Tracer:
+    """Appends one JSON line per timed span to a trace file"""
+
+    def __init__(self, path:str):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, record:dict):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def start_tracing(path:Optional[str]=None)->str:
+    """Start writing spans to a trace file (logs/trace-<time>.jsonl by default). Returns its path"""
+    global _tracer
+    if path is None:
+        path = os.path.join(TRACE_DIR, f"trace-{datetime.datetime.now():%Y%m%d-%H%M%S}.jsonl")
+    _tracer = Tracer(path)
+    return path
+
+
+def stop_tracing():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+
+def current_tags()->dict:
+    return dict(getattr(_context, "tags", {}))
+
+
+@contextmanager
+def trace_context(**tags):
+    """Tag every span recorded in this thread inside the block (eg account, config, video, prompt)"""
+    previous = getattr(_context, "tags", {})
+    _context.tags = {**previous, **tags}
+    try:
+        yield
+    finally:
+        _context.tags = previous
+
+
+def record_span(phase:str, start:float, end:float, **tags):
+    """Record a span that was timed elsewhere (times from time.time())"""
+    if _tracer is None:
+        return
+    _tracer.write({"phase": phase, "start": start, "end": end, "duration": end - start, **current_tags(), **tags})
+
+
+@contextmanager
+def span(phase:str, **tags):
+    """Time the block and record it as a span of the given phase"""
+    start = time.time()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record_span(phase, start, time.time(), status=status, **tags)
+
+
+def percentile(values:list, fraction:float)->float:
+    values = sorted(values)
+    index = (len(values) - 1) * fraction
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+def summarize(path:str)->dict:
+    """Get p50/p95 per phase and chapters per hour from a trace file"""
+    durations = {}
+    chapters = 0
+    first_start = last_end = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            durations.setdefault(record["phase"], []).append(record["duration"])
+            if record["phase"] == "file_write":
+                chapters += record.get("chapters", 0)
+            first_start = record["start"] if first_start is None else min(first_start, record["start"])
+            last_end = record["end"] if last_end is None else max(last_end, record["end"])
+
+    phases = {phase: {"count": len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "total": sum(values)}
+              for phase, values in durations.items()}
+    hours = (last_end - first_start) / 3600 if first_start is not None else 0
+    return {"phases": phases, "chapters": chapters, "chapters_per_hour": chapters / hours if hours else 0.0}
+
+
+def print_summary(path:str):
+    """Print the summary of a trace file"""
+    summary = summarize(path)
+    print("\n" + "=" * 64)
+    print(" Run Summary ".center(64, "="))
+    print("=" * 64)
+    print(f"{'Phase':<22}{'Count':>8}{'p50 (s)':>11}{'p95 (s)':>11}{'Total (s)':>12}")
+    print("-" * 64)
+    for phase in list(PHASES) + sorted(set(summary["phases"]) - set(PHASES)):
+        if phase in summary["phases"]:
+            stats = summary["phases"][phase]
+            print(f"{phase:<22}{stats['count']:>8}{stats['p50']:>11.2f}{stats['p95']:>11.2f}{stats['total']:>12.1f}")
+    print("-" * 64)
+    print(f"Chapters: {summary['chapters']}  Throughput: {summary['chapters_per_hour']:.1f} chapters/hour")
+    print(f"Trace file: {path}")
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import select
+import signal
+import datetime
+import threading
+
+
+WAKE_FILE = "wake.now"  # Create this file to end every limit wait
+COUNTDOWN_SECONDS = 1  # How often the countdown is redrawn
+CHECK_SECONDS = 5  # How often the wake file is checked when there is no countdown
+
+_wake_count = 0
+_event = threading.Event()
+_pipe = os.pipe() if os.name != "nt" else None
+
+
+def wake():
+    """End every limit wait now. Safe to call from a signal handler or another thread"""
+    global _wake_count
+    _wake_count += 1
+    _event.set()
+    if _pipe is not None:
+        try:
+            os.write(_pipe[1], b"x")
+        except OSError:
+            pass
+
+
+def wake_count()->int:
+    return _wake_count
+
+
+def woken_since(count:int)->bool:
+    """Check whether wake() was called (or the wake file created) since wake_count() returned count"""
+    if os.path.exists(WAKE_FILE):
+        try:
+            os.remove(WAKE_FILE)
+        except OSError:
+            pass
+        wake()
+    return _wake_count != count
+
+
+def install_signal_handler():
+    """Make SIGUSR1 end limit waits (POSIX only, must be called from the main thread)"""
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, lambda signum, frame: wake())
+
+
+def _wait_for_enter(timeout:float, interactive:bool)->bool:
+    """Sleep up to timeout seconds, returning early on wake(). Returns True if Enter was pressed"""
+    if os.name == "nt":
+        if not interactive:
+            _event.wait(timeout)
+            return False
+        import msvcrt
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if msvcrt.kbhit() and msvcrt.getwch() == "\r":
+                return True
+            if _event.wait(0.25):
+                return False
+        return False
+
+    watched = [_pipe[0], sys.stdin] if interactive else [_pipe[0]]
+    readable, _, _ = select.select(watched, [], [], timeout)
+    if _pipe[0] in readable:
+        os.read(_pipe[0], 1024)
+    if sys.stdin in readable:
+        sys.stdin.readline()
+        return True
+    return False
+
+
+def wait_until(deadline:datetime.datetime, countdown:bool=True)->bool:
+    """Sleep until deadline without using the CPU. Returns True if the wait was ended early.
+
+    The wait ends early when Enter is pressed (if stdin is a terminal), when WAKE_FILE is
+    created or when the process gets SIGUSR1. Only the calling thread is blocked.
+    """
+    interactive = bool(sys.stdin) and sys.stdin.isatty()
+    countdown = countdown and interactive and sys.stdout.isatty()  # Not in quiet mode
+    start_count = _wake_count
+    _event.clear()
+    while True:
+        remaining = (deadline - datetime.datetime.now()).total_seconds()
+        if remaining <= 0:
+            print("\nTime's up!.")
+            return False
+        if countdown:
+            mins, secs = divmod(remaining, 60)
+            hours, mins = divmod(mins, 60)
+            sys.stdout.write("\rTime left: {:02d}:{:02d}:{:02d} Press Enter to resume Now... ".format(int(hours), int(mins), int(secs)))
+            sys.stdout.flush()
+        if woken_since(start_count):
+            print("\nWoken up, resuming now!")
+            return True
+        if _wait_for_enter(min(remaining, COUNTDOWN_SECONDS if countdown else CHECK_SECONDS), interactive):
+            print("\nUser pressed Enter!")
+            return True
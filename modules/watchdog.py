@@ -0,0 +1,100 @@
+import time
+import logging
+import traceback
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Thresholds of the optional "recycle" config section. A tab is recycled when the page's
+# JavaScript heap grows too big; the whole browser when its memory, the number of videos
+# or its uptime does. 0 turns a threshold off.
+DEFAULT_RECYCLE_POLICY = {"max_rss_mb": 3000, "max_js_heap_mb": 1000, "max_videos": 50, "max_uptime_hours": 6}
+
+_warned_no_psutil = False
+
+
+def get_recycle_policy(config:dict)->dict:
+    """Get the recycle policy from the config's optional "recycle" section"""
+    return {**DEFAULT_RECYCLE_POLICY, **config.get("recycle", {})}
+
+
+def browser_processes(driver)->list:
+    """Get the chromedriver and Chrome processes (browser, renderers, GPU...) of a driver. Needs psutil"""
+    if psutil is None:
+        return []
+    roots = []
+    for pid in (getattr(driver, "browser_pid", None), getattr(getattr(getattr(driver, "service", None), "process", None), "pid", None)):
+        if pid:
+            try:
+                roots.append(psutil.Process(pid))
+            except psutil.Error:
+                pass
+    processes = {}
+    for root in roots:
+        try:
+            for process in [root] + root.children(recursive=True):
+                processes[process.pid] = process
+        except psutil.Error:
+            pass
+    return list(processes.values())
+
+
+def sample_memory(driver)->dict:
+    """Get {"rss_mb": total RSS of the browser processes or None, "js_heap_mb": JS heap of the current tab or None}"""
+    rss = 0
+    processes = browser_processes(driver)
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    js_heap = None
+    try:
+        driver.execute_cdp_cmd("Performance.enable", {})
+        metrics = {metric["name"]: metric["value"] for metric in driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]}
+        js_heap = metrics.get("JSHeapUsedSize")
+    except Exception:
+        logging.warning(f"Could not read the page's performance metrics: {traceback.format_exc()}")
+    return {"rss_mb": rss / 2**20 if processes else None, "js_heap_mb": js_heap / 2**20 if js_heap is not None else None}
+
+
+class BrowserWatchdog:
+    """Decides when a long running browser should be recycled, checked between videos"""
+
+    def __init__(self, policy:dict):
+        global _warned_no_psutil
+        self.policy = policy
+        if policy["max_rss_mb"] and psutil is None and not _warned_no_psutil:
+            # Without psutil the browser memory is never measured, so max_rss_mb would silently never trigger
+            _warned_no_psutil = True
+            print(f"WARNING: psutil is not installed, so the browser memory limit (max_rss_mb {policy['max_rss_mb']}) is not checked. "
+                  "Install it with 'pip install psutil'")
+            logging.warning("psutil is not installed, max_rss_mb is ignored")
+        self.reset()
+
+    def reset(self):
+        """Start counting again for a new browser"""
+        self.started_at = time.time()
+        self.videos = 0
+
+    def video_done(self):
+        self.videos += 1
+
+    def check(self, driver)->tuple:
+        """Sample the browser and get (action, reason) where action is None, "tab" or "driver" """
+        memory = sample_memory(driver)
+        logging.info(f"Browser memory after {self.videos} videos: {memory}")
+        policy = self.policy
+        uptime_hours = (time.time() - self.started_at) / 3600
+        if policy["max_rss_mb"] and memory["rss_mb"] is not None and memory["rss_mb"] > policy["max_rss_mb"]:
+            return "driver", f"browser memory {memory['rss_mb']:.0f} MB"
+        if policy["max_videos"] and self.videos >= policy["max_videos"]:
+            return "driver", f"{self.videos} videos"
+        if policy["max_uptime_hours"] and uptime_hours >= policy["max_uptime_hours"]:
+            return "driver", f"uptime {uptime_hours:.1f} hours"
+        if policy["max_js_heap_mb"] and memory["js_heap_mb"] is not None and memory["js_heap_mb"] > policy["max_js_heap_mb"]:
+            return "tab", f"page heap {memory['js_heap_mb']:.0f} MB"
+        return None, None
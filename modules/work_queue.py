@@ -0,0 +1,360 @@
+"""Shared queue of (config, video) jobs, so several main.py processes (on one or more machines) can drain one backlog.
+
+A worker claims a job under a lease and renews it with heartbeats while it runs. If the
+worker dies its lease runs out and the job goes back to the queue for someone else.
+The queue is a SQLite database guarded by a fasteners file lock; for machines that don't
+share a folder, one of them can serve it over TCP. The server has no authentication and only
+listens on localhost unless another --host is given, so only expose it on a trusted network:
+
+    python -m modules.work_queue add --config stories --videos 1-200
+    python -m modules.work_queue serve --host 0.0.0.0 --port 8765
+    python main.py --queue tcp://queue-host:8765 --config stories --accounts all
+    python -m modules.work_queue status
+"""
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import datetime
+import logging
+import argparse
+import threading
+import traceback
+import socketserver
+from typing import Optional
+import fasteners
+
+from modules import wakeup
+from modules.scheduler import QuotaScheduler, save_reactivation_time
+from modules.tracing import span
+
+
+QUEUE_PATH = os.path.join("outputFiles", "queue.sqlite")
+DEFAULT_LEASE_SECONDS = 10 * 60
+CLAIM_POLL_SECONDS = 30  # How often to look again while other workers hold the remaining jobs
+
+
+class SQLiteQueue:
+    """Jobs in a SQLite database. Claims run under an inter-process file lock and an immediate transaction"""
+
+    def __init__(self, path:str=QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = fasteners.InterProcessLock(path + ".lock")
+        self.thread_lock = threading.Lock()  # File locks don't exclude threads of the same process
+        with self.transaction() as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                config TEXT NOT NULL, video INTEGER NOT NULL, status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT,
+                updated_at REAL, PRIMARY KEY (config, video))""")
+
+    def transaction(self):
+        return _Transaction(self)
+
+    def add(self, config:str, videos:list)->int:
+        """Queue videos that aren't queued yet. Returns how many were added"""
+        with self.transaction() as connection:
+            before = connection.total_changes
+            connection.executemany("INSERT OR IGNORE INTO jobs (config, video, updated_at) VALUES (?, ?, ?)",
+                                   [(config, int(video), time.time()) for video in videos])
+            return connection.total_changes - before
+
+    def claim(self, owner:str, config:str, lease_seconds:float=DEFAULT_LEASE_SECONDS)->Optional[int]:
+        """Lease the lowest pending video of the config (or one whose lease ran out). Returns None if there is none"""
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute("""SELECT video FROM jobs WHERE config = ?
+                AND (status = 'pending' OR (status = 'leased' AND lease_until < ?)) ORDER BY video LIMIT 1""",
+                                     (config, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute("""UPDATE jobs SET status = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1,
+                updated_at = ? WHERE config = ? AND video = ?""", (owner, now + lease_seconds, now, config, row[0]))
+            return row[0]
+
+    def heartbeat(self, owner:str, config:str, video:int, lease_seconds:float=DEFAULT_LEASE_SECONDS)->bool:
+        """Extend the lease. Returns False if the job isn't leased to this owner any more"""
+        now = time.time()
+        with self.transaction() as connection:
+            cursor = connection.execute("""UPDATE jobs SET lease_until = ?, updated_at = ?
+                WHERE config = ? AND video = ? AND owner = ? AND status = 'leased'""", (now + lease_seconds, now, config, video, owner))
+            return cursor.rowcount == 1
+
+    def complete(self, owner:str, config:str, video:int, error:Optional[str]=None)->bool:
+        """Mark a leased job done (or failed). Returns False if the lease was lost to another worker"""
+        with self.transaction() as connection:
+            cursor = connection.execute("""UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ?
+                WHERE config = ? AND video = ? AND owner = ? AND status = 'leased'""",
+                                        ("failed" if error else "done", error, time.time(), config, video, owner))
+            return cursor.rowcount == 1
+
+    def release(self, owner:str, config:str, video:int)->bool:
+        """Put a leased job back in the queue right away (eg the account hit its limit)"""
+        with self.transaction() as connection:
+            cursor = connection.execute("""UPDATE jobs SET status = 'pending', owner = NULL, lease_until = NULL,
+                attempts = attempts - 1, updated_at = ? WHERE config = ? AND video = ? AND owner = ? AND status = 'leased'""",
+                                        (time.time(), config, video, owner))
+            return cursor.rowcount == 1
+
+    def counts(self, config:str)->dict:
+        """Get the number of jobs of the config per status"""
+        with self.transaction() as connection:
+            rows = connection.execute("SELECT status, COUNT(*) FROM jobs WHERE config = ? GROUP BY status", (config,)).fetchall()
+        return {"pending": 0, "leased": 0, "done": 0, "failed": 0, **dict(rows)}
+
+
+class _Transaction:
+    """File lock + immediate SQLite transaction, committed on success and rolled back on error"""
+
+    def __init__(self, queue:SQLiteQueue):
+        self.queue = queue
+
+    def __enter__(self)->sqlite3.Connection:
+        self.queue.thread_lock.acquire()
+        self.queue.lock.acquire()
+        self.connection = sqlite3.connect(self.queue.path, timeout=30, isolation_level=None)
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+            self.connection.close()
+        finally:
+            self.queue.lock.release()
+            self.queue.thread_lock.release()
+
+
+class QueueRequestHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line: {"op": "claim", "args": {...}} -> {"result": ...} or {"error": ...}"""
+
+    OPS = ("add", "claim", "heartbeat", "complete", "release", "counts")
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("op") not in self.OPS:
+                    raise ValueError(f"Unknown operation: {request.get('op')}")
+                response = {"result": getattr(self.server.queue, request["op"])(**request.get("args", {}))}
+            except Exception as e:
+                logging.error(f"Queue request failed: {traceback.format_exc()}")
+                response = {"error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+class QueueServer(socketserver.ThreadingTCPServer):
+    """Serves a SQLiteQueue over TCP for machines that don't share a folder. Requests are not authenticated"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, queue:SQLiteQueue, host:str="127.0.0.1", port:int=8765):
+        super().__init__((host, port), QueueRequestHandler)
+        self.queue = queue
+
+
+class RemoteQueue:
+    """Client of a QueueServer, with the same methods as SQLiteQueue"""
+
+    def __init__(self, host:str, port:int, timeout:float=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def call(self, op:str, **args):
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as connection:
+            connection.sendall((json.dumps({"op": op, "args": args}) + "\n").encode("utf-8"))
+            response = json.loads(connection.makefile("r", encoding="utf-8").readline())
+        if "error" in response:
+            raise RuntimeError(f"Queue server error: {response['error']}")
+        return response["result"]
+
+    def add(self, config:str, videos:list)->int:
+        return self.call("add", config=config, videos=list(videos))
+
+    def claim(self, owner:str, config:str, lease_seconds:float=DEFAULT_LEASE_SECONDS)->Optional[int]:
+        return self.call("claim", owner=owner, config=config, lease_seconds=lease_seconds)
+
+    def heartbeat(self, owner:str, config:str, video:int, lease_seconds:float=DEFAULT_LEASE_SECONDS)->bool:
+        return self.call("heartbeat", owner=owner, config=config, video=video, lease_seconds=lease_seconds)
+
+    def complete(self, owner:str, config:str, video:int, error:Optional[str]=None)->bool:
+        return self.call("complete", owner=owner, config=config, video=video, error=error)
+
+    def release(self, owner:str, config:str, video:int)->bool:
+        return self.call("release", owner=owner, config=config, video=video)
+
+    def counts(self, config:str)->dict:
+        return self.call("counts", config=config)
+
+
+def open_queue(spec:str=QUEUE_PATH):
+    """Open a queue from a path to a SQLite file or a tcp://host:port address"""
+    if spec.startswith("tcp://"):
+        host, _, port = spec[len("tcp://"):].rpartition(":")
+        return RemoteQueue(host, int(port))
+    return SQLiteQueue(spec)
+
+
+class LeaseLostError(Exception):
+    """Raised instead of saving a video whose lease was lost, as another worker may be processing it"""
+
+
+class Lease(threading.Thread):
+    """Renews the lease of a claimed job every third of the lease time until stopped"""
+
+    def __init__(self, queue, owner:str, config:str, video:int, lease_seconds:float=DEFAULT_LEASE_SECONDS):
+        super().__init__(name=f"lease-{video}", daemon=True)
+        self.queue = queue
+        self.owner = owner
+        self.config = config
+        self.video = video
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(self.owner, self.config, self.video, self.lease_seconds):
+                    self.lost = True
+                    print(f"Lost the lease on video {self.video}, another worker may be processing it")
+                    logging.warning(f"Lost the lease on video {self.video} ({self.owner})")
+                    return
+            except Exception:
+                # A missed heartbeat is fine as long as a later one gets through before the lease runs out
+                logging.error(f"Heartbeat for video {self.video} failed: {traceback.format_exc()}")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def worker_owner(account:str)->str:
+    """Lease owner name of an account's worker in this process"""
+    return f"{socket.gethostname()}:{os.getpid()}/{account}"
+
+
+class QueueScheduler(QuotaScheduler):
+    """A QuotaScheduler that takes videos from a shared queue instead of a local list.
+
+    An account that hits its limit releases its video straight back to the queue. When
+    the queue has nothing pending but other workers still hold leases, this keeps
+    polling in case one of them dies and its video is re-queued.
+    """
+
+    def __init__(self, queue, config_name:str, accounts:list, lease_seconds:float=DEFAULT_LEASE_SECONDS):
+        super().__init__(accounts, [])
+        self.queue = queue
+        self.config_name = config_name
+        self.lease_seconds = lease_seconds
+        self.leases = {}
+
+    def next_video(self, account:str, idle=None):
+        while True:
+            with self.condition:
+                waiting = not self.has_quota(account)
+            if waiting:
+                if idle is not None:
+                    callback, idle = idle, None
+                    callback()
+                with span("limit_wait", account=account):
+                    checked_at = 0
+                    while True:
+                        if time.time() - checked_at >= CLAIM_POLL_SECONDS:
+                            # Once every job is done there is nothing left to wait for
+                            if self.queue_empty():
+                                return None
+                            checked_at = time.time()
+                        with self.condition:
+                            if self.has_quota(account):
+                                break
+                            timeout = (self.reactivation[account] - datetime.datetime.now()).total_seconds()
+                            self.condition.wait(timeout=min(max(timeout, 0), wakeup.CHECK_SECONDS))
+            owner = worker_owner(account)
+            video_number = self.queue.claim(owner, self.config_name, self.lease_seconds)
+            if video_number is not None:
+                lease = Lease(self.queue, owner, self.config_name, video_number, self.lease_seconds)
+                lease.start()
+                with self.condition:
+                    self.in_progress += 1
+                    self.leases[video_number] = lease
+                return video_number
+            if idle is not None:
+                # The video this worker still holds is one of the leased ones
+                callback, idle = idle, None
+                callback()
+                continue
+            counts = self.queue.counts(self.config_name)
+            if counts["leased"] == 0:
+                return None
+            print(f"[{account}] {counts['leased']} videos are leased by other workers, checking again in {CLAIM_POLL_SECONDS}s")
+            time.sleep(CLAIM_POLL_SECONDS)
+
+    def lease_lost(self, video_number)->bool:
+        with self.condition:
+            lease = self.leases.get(video_number)
+        return lease is not None and lease.lost
+
+    def queue_empty(self)->bool:
+        counts = self.queue.counts(self.config_name)
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+    def _end_lease(self, video_number)->Optional[Lease]:
+        with self.condition:
+            self.in_progress -= 1
+            lease = self.leases.pop(video_number, None)
+            self.condition.notify_all()
+        if lease is not None:
+            lease.stop()
+        return lease
+
+    def finish_video(self, video_number, error:Optional[str]=None):
+        lease = self._end_lease(video_number)
+        if lease is not None and not self.queue.complete(lease.owner, self.config_name, video_number, error):
+            logging.warning(f"Finished video {video_number} after losing its lease")
+
+    def limit_reached(self, account:str, video_number, reactivation_at):
+        lease = self._end_lease(video_number)
+        if lease is not None:
+            self.queue.release(lease.owner, self.config_name, video_number)
+        with self.condition:
+            self.reactivation[account] = reactivation_at
+        # A restarted worker waits for the same time instead of using the exhausted account straight away
+        save_reactivation_time(account, reactivation_at)
+        print(f"[{account}] Limit reached, video {video_number} goes back to the queue. Account resumes at {reactivation_at:%H:%M}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the shared video queue")
+    parser.add_argument("--queue", default=QUEUE_PATH, help="SQLite file or tcp://host:port")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add = subparsers.add_parser("add", help="Queue videos of a configuration")
+    add.add_argument("--config", required=True)
+    add.add_argument("--videos", required=True, help="Video set, eg 1-15,22,40-60")
+    status = subparsers.add_parser("status", help="Show the jobs of a configuration per status")
+    status.add_argument("--config", required=True)
+    serve = subparsers.add_parser("serve", help="Serve the SQLite queue over TCP")
+    serve.add_argument("--host", default="127.0.0.1",
+                       help="Address to listen on. The server has no authentication, so only use 0.0.0.0 on a trusted network")
+    serve.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = QueueServer(SQLiteQueue(args.queue), args.host, args.port)
+        print(f"Serving {args.queue} on tcp://{args.host}:{server.server_address[1]}")
+        server.serve_forever()
+        return
+    queue = open_queue(args.queue)
+    if args.command == "add":
+        from main import parse_video_set
+        videos = parse_video_set(args.videos)
+        print(f"Queued {queue.add(args.config, videos)} of {len(videos)} videos for {args.config}")
+    else:
+        print(", ".join(f"{status}: {count}" for status, count in queue.counts(args.config).items()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+import logging
+import threading
+import traceback
+from modules.automation_parts import launch_driver, handle_login, save_cookies, process_video, generate_video, extract_video, ChapterCheckpointer, invalidate_session, LimitReachedError, SessionExpiredError, SESSION_TTL_SECONDS
+from modules.cdp_capture import CompletionCapture, CapturedArtifacts
+from modules.scheduler import QuotaScheduler
+from modules.work_queue import QueueScheduler, LeaseLostError
+from modules.tracing import span, trace_context
+from modules.watchdog import BrowserWatchdog, get_recycle_policy
+from modules import pacing, snapshots
+
+
+# Manual logins ask for input, so only one worker may log in at a time
+login_lock = threading.Lock()
+
+
+class AccountWorker:
+    """One account with its own browser, logged in once and reused for many videos"""
+
+    def __init__(self, account:str, config_name:str, config:dict, headless:bool=False, driver_pool=None, interactive:bool=True, postprocessor=None):
+        self.account = account
+        self.config_name = config_name
+        self.config = config
+        self.headless = headless
+        self.driver_pool = driver_pool
+        self.postprocessor = postprocessor
+        self.interactive = interactive
+        self.persistent_profile = config.get("persistent_profile", True)
+        self.session_ttl = config.get("session_ttl_hours", SESSION_TTL_SECONDS / 3600) * 3600
+        self.pipeline = config.get("pipeline", False)
+        pacing.configure(config.get("humanize", False), config.get("pacing_jitter", pacing.DEFAULT_JITTER_SECONDS))
+        snapshots.configure_from(config)
+        self.driver = None
+        self.capture = None
+        self.generation_tab = None
+        self.extraction_tab = None
+        self.pending_extraction = None
+        self.on_extracted = None  # on_extracted(video_number, error) is called once a pipelined video is extracted
+        self.lease_lost = None  # lease_lost(video_number) tells whether another worker may have taken the video over
+        self.watchdog = BrowserWatchdog(get_recycle_policy(config))
+
+    @property
+    def output_dir(self)->str:
+        return self.account + "-" + self.config_name
+
+    def start(self):
+        """Launch the browser (or take a pre-launched one) and log in"""
+        capture_mode = self.config.get("capture_mode", "dom")
+        if self.driver_pool is not None:
+            self.driver = self.driver_pool.get(self.account, capture_mode, self.headless, self.persistent_profile)
+        else:
+            self.driver = launch_driver(capture_mode, self.headless, self.account if self.persistent_profile else None)
+        self.login()
+        if capture_mode == "cdp":
+            self.capture = CompletionCapture(self.driver)
+        self.watchdog.reset()
+
+    def login(self):
+        with login_lock, trace_context(account=self.account, config=self.config_name), span("login"):
+            print(f"[{self.account}] Logging in...")
+            handle_login(self.driver, self.account, self.persistent_profile, self.session_ttl, self.interactive)
+            print(f"[{self.account}] Login successful!")
+
+    def process(self, video_number, on_limit:str="wait", journal=None)->bool:
+        """Generate and download one video, recording its progress in the journal.
+
+        Returns False if the video was pipelined: it is only extracted during the next video
+        (or by flush()), and on_extracted reports how that went.
+        """
+        progress = journal.for_video(self.account, self.config_name, video_number) if journal is not None else None
+        run = self.generate_pipelined if self.pipeline else process_video
+        check_lease = lambda: self.check_lease(video_number)
+        with trace_context(account=self.account, config=self.config_name, video=video_number), span("video"):
+            try:
+                video = run(self.driver, self.config, self.output_dir, video_number, self.capture, on_limit, progress, check_lease)
+            except SessionExpiredError:
+                print(f"[{self.account}] Session expired, logging in again")
+                invalidate_session(self.account)
+                self.login()
+                video = run(self.driver, self.config, self.output_dir, video_number, self.capture, on_limit, progress, check_lease)
+        # Pipelined videos are post-processed once extract_in_tab has saved them
+        if video is not None:
+            self.postprocess(video_number, video)
+        return not self.pipeline
+
+    def check_lease(self, video_number):
+        """Raise LeaseLostError if the video's queue lease was lost, so the video isn't saved twice"""
+        if self.lease_lost is not None and self.lease_lost(video_number):
+            raise LeaseLostError(f"Lost the lease on video {video_number}, not saving it")
+
+    def postprocess(self, video_number, video):
+        """Hand a saved video to the post-processing pool, if there is one"""
+        if self.postprocessor is None:
+            return
+        try:
+            self.postprocessor.submit(video, video_number, self.account)
+        except Exception as e:
+            print(f"[{self.account}] Could not queue video {video_number} for post-processing: {e}")
+            logging.error(f"Could not queue video {video_number} for post-processing: {traceback.format_exc()}")
+
+    def generate_pipelined(self, driver, config:dict, output_dir:str, video_number, capture=None, on_limit:str="wait", progress=None,
+                           before_extraction=None):
+        """Generate a video while the previous one is extracted in a second tab.
+
+        The previous video's extraction runs right after this video's first prompt is
+        sent, so it overlaps with Claude's response. This video is extracted during the next one
+        (or by flush() at the end).
+        """
+        previous, self.pending_extraction = self.pending_extraction, None
+        if self.generation_tab is None:
+            self.generation_tab = driver.current_window_handle
+
+        def extract_previous():
+            nonlocal previous
+            if previous is not None:
+                job, previous = previous, None
+                self.extract_in_tab(job)
+
+        checkpointer = ChapterCheckpointer(driver, config, output_dir, video_number) if config.get("incremental", False) else None
+        try:
+            resumed = generate_video(driver, config, video_number, capture, on_limit, progress, while_waiting=extract_previous, checkpointer=checkpointer)
+        finally:
+            extract_previous()
+        artifacts = None
+        if capture is not None and not resumed:
+            # The capture is reset by the next video, so keep what it has for this one
+            artifacts = CapturedArtifacts(capture.artifacts())
+        self.pending_extraction = {"video_number": video_number, "url": driver.current_url, "progress": progress, "artifacts": artifacts,
+                                   "video": checkpointer.video if checkpointer is not None else None, "before_extraction": before_extraction}
+
+    def extract_in_tab(self, job:dict):
+        """Open a finished conversation in the extraction tab and download its artifacts"""
+        driver = self.driver
+        error = None
+        try:
+            if job["before_extraction"] is not None:
+                job["before_extraction"]()
+            if self.extraction_tab is None:
+                driver.switch_to.new_window("tab")
+                self.extraction_tab = driver.current_window_handle
+            else:
+                driver.switch_to.window(self.extraction_tab)
+            with trace_context(video=job["video_number"], prompt=None), span("page_load"):
+                driver.get(job["url"])
+            with trace_context(video=job["video_number"], prompt=None):
+                video = extract_video(driver, self.config, self.output_dir, job["video_number"], job["artifacts"], job["progress"], job["video"])
+            self.postprocess(job["video_number"], video)
+        except Exception as e:
+            print(f"[{self.account}] Error extracting video {job['video_number']}: {e}")
+            logging.error(f"Error extracting video {job['video_number']} with {self.account}: {traceback.format_exc()}")
+            error = str(e)
+        finally:
+            try:
+                driver.switch_to.window(self.generation_tab)
+            finally:
+                if self.on_extracted is not None:
+                    self.on_extracted(job["video_number"], error)
+
+    def after_video(self):
+        """Called between videos: recycle the tab or the whole browser if the watchdog says so"""
+        self.watchdog.video_done()
+        try:
+            action, reason = self.watchdog.check(self.driver)
+        except Exception:
+            logging.error(f"Watchdog check failed for {self.account}: {traceback.format_exc()}")
+            return
+        if action is None:
+            return
+        print(f"[{self.account}] Recycling the {'browser' if action == 'driver' else 'tab'} ({reason})")
+        with trace_context(account=self.account, config=self.config_name), span("browser_recycle", action=action, reason=reason):
+            if action == "driver":
+                self.recycle_driver()
+            else:
+                self.recycle_tab()
+
+    def recycle_tab(self):
+        """Replace the generation tab with a fresh one, freeing everything the old page held"""
+        driver = self.driver
+        old_tab = self.generation_tab or driver.current_window_handle
+        driver.switch_to.new_window("tab")
+        new_tab = driver.current_window_handle
+        driver.switch_to.window(old_tab)
+        driver.close()
+        driver.switch_to.window(new_tab)
+        self.generation_tab = new_tab
+        if self.capture is not None:
+            # Network events are collected per tab
+            self.capture = CompletionCapture(driver)
+
+    def recycle_driver(self):
+        """Quit the browser and start a new one, logging in again through the cached session"""
+        self.flush()  # The pipelined video still needs the old browser
+        try:
+            save_cookies(self.driver, self.account)
+        finally:
+            self.driver.quit()
+        self.driver = None
+        self.capture = None
+        self.generation_tab = None
+        self.extraction_tab = None
+        capture_mode = self.config.get("capture_mode", "dom")
+        self.driver = launch_driver(capture_mode, self.headless, self.account if self.persistent_profile else None)
+        self.login()
+        if capture_mode == "cdp":
+            self.capture = CompletionCapture(self.driver)
+        self.watchdog.reset()
+
+    def flush(self):
+        """Extract the last generated video if its extraction is still pending"""
+        job, self.pending_extraction = self.pending_extraction, None
+        if job is not None:
+            self.extract_in_tab(job)
+
+    def close(self):
+        """Save cookies and close the browser"""
+        if self.driver is None:
+            return
+        try:
+            self.flush()
+        except Exception:
+            logging.error(f"Error extracting the last video of {self.account}: {traceback.format_exc()}")
+        logging.info(f"Learned action latencies: {pacing.latencies()}")
+        try:
+            save_cookies(self.driver, self.account)
+        finally:
+            self.driver.quit()
+            self.driver = None
+
+
+def start_workers(workers:list)->list:
+    """Start all workers in parallel. Returns the workers that started successfully"""
+    started = []
+
+    def start(worker):
+        try:
+            worker.start()
+            started.append(worker)
+        except Exception as e:
+            print(f"[{worker.account}] Failed to start: {e}")
+            logging.error(f"Failed to start worker for {worker.account}: {traceback.format_exc()}")
+            worker.close()
+
+    threads = [threading.Thread(target=start, args=(worker,), name=f"start-{worker.account}") for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [worker for worker in workers if worker in started]
+
+
+def run_pool(workers:list, video_numbers:list, journal=None, on_result=None, work_queue=None)->dict:
+    """Process the video numbers with all workers in parallel, each taking the next video from a shared queue.
+
+    With several workers, a worker that hits the message limit hands its video to the
+    others and sleeps until its quota returns. A single worker waits in place instead,
+    so it can continue the same conversation. Videos the journal already has intact
+    chapter files for are skipped. on_result(video_number, result) is called as each video finishes
+    (for pipelined videos, once they are extracted).
+    With a work_queue the videos are claimed from the shared queue (video_numbers are added to it first).
+    Returns {video_number: {"account": ..., "error": None or message}}.
+    """
+    results = {}
+    config_name = workers[0].config_name
+    if work_queue is not None:
+        if video_numbers:
+            print(f"Queued {work_queue.add(config_name, video_numbers)} new videos")
+        video_numbers = []
+    if journal is not None:
+        for video_number in video_numbers:
+            output_dir = journal.completed_output(config_name, video_number)
+            if output_dir:
+                print(f"Skipping video {video_number}, already done in {output_dir}")
+                results[video_number] = {"account": None, "error": None, "skipped": True}
+        video_numbers = [video_number for video_number in video_numbers if video_number not in results]
+
+    if work_queue is not None:
+        scheduler = QueueScheduler(work_queue, config_name, [worker.account for worker in workers])
+    else:
+        scheduler = QuotaScheduler([worker.account for worker in workers], video_numbers)
+    on_limit = "raise" if len(workers) > 1 else "wait"
+
+    def report(worker, video_number, error):
+        # The queue job of a pipelined video is only completed once the video is extracted
+        results[video_number] = {"account": worker.account, "error": error}
+        scheduler.finish_video(video_number, error)
+        if on_result is not None:
+            on_result(video_number, results[video_number])
+
+    def work(worker):
+        worker.on_extracted = lambda video_number, error: report(worker, video_number, error)
+        worker.lease_lost = scheduler.lease_lost
+        while True:
+            # A pipelined video still waiting for extraction is extracted before the worker waits
+            video_number = scheduler.next_video(worker.account, idle=worker.flush)
+            if video_number is None:
+                return
+            output_dir = journal.completed_output(config_name, video_number) if work_queue is not None and journal is not None else None
+            if output_dir:
+                print(f"Skipping video {video_number}, already done in {output_dir}")
+                results[video_number] = {"account": None, "error": None, "skipped": True}
+                scheduler.finish_video(video_number)
+                continue
+            error = None
+            try:
+                finished = worker.process(video_number, on_limit, journal)
+            except LimitReachedError as e:
+                scheduler.limit_reached(worker.account, video_number, e.reactivation_at)
+                continue
+            except Exception as e:
+                print(f"[{worker.account}] Error processing video {video_number}: {e}")
+                logging.error(f"Error processing video {video_number} with {worker.account}: {traceback.format_exc()}")
+                finished, error = True, str(e)
+            if finished:
+                report(worker, video_number, error)
+            try:
+                # Between videos nothing is in flight, and the next video isn't claimed yet
+                worker.after_video()
+            except Exception as e:
+                print(f"[{worker.account}] Could not restart the browser, stopping this account: {e}")
+                logging.error(f"Error recycling the browser of {worker.account}: {traceback.format_exc()}")
+                return
+
+    threads = [threading.Thread(target=work, args=(worker,), name=f"worker-{worker.account}") for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Pipelined workers still hold their last video, which is reported once extracted
+    for worker in workers:
+        worker.flush()
+    return results